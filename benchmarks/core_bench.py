@@ -0,0 +1,106 @@
+# benchmarks/core_bench.py
+# Times the core.model and core.excel_io hot paths on synthetic forms and writes the results as JSON:
+#   python -m benchmarks.core_bench --rows 100 1000 10000 50000 -o results.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_fields, make_document, make_dataframe
+from core.excel_io import load_excel_file, save_excel_file
+from core.model import FormDocument
+
+SIZES = (100, 1000, 10000, 50000)
+
+
+def time_case(setup, run, repeat):
+    # setup() builds fresh input for every run, so only run(input) is timed
+    seconds = []
+    for _ in range(repeat):
+        value = setup()
+        started = time.perf_counter()
+        run(value)
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def add_fields(fields):
+    document = FormDocument()
+    for field in fields:
+        document.add_field(field)
+
+
+def workbook(path, rows, options):
+    if not os.path.exists(path):
+        save_excel_file(path, make_document(rows, **options), use_cache=False)
+    return path
+
+
+def cases(rows, options, directory):
+    # (name, setup, run) for every measured operation
+    path = os.path.join(directory, f"form_{rows}.xlsx")
+    yield "add_field", lambda: make_fields(rows, **options), add_fields
+    yield "_refresh", lambda: make_document(rows, **options), lambda document: document._refresh()
+    yield "load_from_dataframe", lambda: make_dataframe(rows, **options), \
+        lambda df: FormDocument().load_from_dataframe(df)
+    yield "copy", lambda: make_document(rows, **options), lambda document: document.copy()
+    yield "export_to_dataframe", lambda: make_document(rows, **options), \
+        lambda document: document.export_to_dataframe()
+    yield "save_excel_file", lambda: make_document(rows, **options), \
+        lambda document: save_excel_file(path, document, use_cache=False)
+    yield "load_excel_file", lambda: workbook(path, rows, options), \
+        lambda source: load_excel_file(source, use_cache=False)
+
+
+def run_benchmarks(sizes=SIZES, repeat=3, only=None, report=None, **options):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hypersic-bench-") as directory:
+        for rows in sizes:
+            for name, setup, run in cases(rows, options, directory):
+                if only and name not in only:
+                    continue
+                seconds = time_case(setup, run, repeat)
+                result = {"case": name, "rows": rows, "seconds": seconds,
+                          "best": min(seconds), "median": statistics.median(seconds)}
+                results.append(result)
+                if report is not None:
+                    report(f"{name:<22}{rows:>8} righe  {result['best'] * 1000:10.2f} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.core_bench",
+                                     description="Benchmark di core.model e core.excel_io su moduli sintetici")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(SIZES), help="numero di righe da provare")
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni per caso (si tiene la migliore)")
+    parser.add_argument("--html-size", type=int, default=400, help="caratteri HTML per campo AN")
+    parser.add_argument("--groups", type=int, default=20, help="numero di gruppi (CATEGORIA)")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="quota di codici duplicati (0-1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="solo questi casi, es. copy _refresh")
+    parser.add_argument("-o", "--output", help="file JSON dei risultati (default: stdout)")
+    args = parser.parse_args(argv)
+
+    options = {"html_size": args.html_size, "groups": args.groups, "duplicate_ratio": args.duplicates,
+               "seed": args.seed}
+    results = run_benchmarks(args.rows, args.repeat, args.only,
+                             report=lambda line: print(line, file=sys.stderr), **options)
+    data = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat, **options},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(data, stream, indent=2)
+    else:
+        json.dump(data, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# benchmarks/gui_bench.py
+# Scripts MainWindow on a synthetic form under the offscreen Qt platform (no display needed) and
+# records wall time, peak RSS and widgets created for each operation:
+#   python -m benchmarks.gui_bench --rows 1000 5000 --mode view legacy -o gui.json
+import argparse
+import atexit
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# No journal thread and no workbook cache of the user's: set before any core module reads them
+os.environ["HYPERSIC_NO_AUTOSAVE"] = "1"
+os.environ["HYPERSIC_CACHE_DIR"] = tempfile.mkdtemp(prefix="hypersic-bench-")
+atexit.register(shutil.rmtree, os.environ["HYPERSIC_CACHE_DIR"], ignore_errors=True)
+
+from PyQt6.QtCore import QObject, QEvent
+from PyQt6.QtWidgets import QApplication
+
+from benchmarks.synthetic import make_document
+
+SIZES = (1000, 5000)
+SELECTION = 200  # rows moved, deleted and pasted at once
+
+
+class WidgetCounter(QObject):
+    # Counts widgets given a parent anywhere in the application (created, or moved into a cell)
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.ChildAdded and event.child().isWidgetType():
+            self.count += 1
+        return False
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+
+def measure(app, counter, name, operation):
+    app.processEvents()
+    counter.count = 0
+    rss = peak_rss_kb()
+    started = time.perf_counter()
+    operation()
+    app.processEvents()  # include the repaint the operation caused
+    seconds = time.perf_counter() - started
+    peak = peak_rss_kb()
+    return {"case": name, "seconds": seconds, "widgets_created": counter.count,
+            "peak_rss_kb": peak, "peak_rss_growth_kb": peak - rss}
+
+
+def edit_cell(window, row):
+    if window.legacy_table:
+        window.table.item(row, 0).setText(f"MODIFICATO_{row}")  # goes through sync_table_to_model
+    else:
+        window.table_model.setData(window.table_model.index(row, 0), f"MODIFICATO_{row}")
+
+
+def script(window, rows):
+    # (name, operation) in the order they run; each one starts from the state the previous left
+    table = window.table
+    block = list(range(rows // 2, rows // 2 + min(SELECTION, rows // 4)))
+
+    yield "refresh_table", window.refresh_table
+    yield "edit_cell", lambda: edit_cell(window, rows // 3)
+    yield "select_rows", lambda: table.select_rows(block)
+    yield "move_selected_rows", lambda: table.move_selected_rows(1)
+    yield "copy", lambda: window.copy_selected_rows(table.selectionModel().selectedRows())
+    yield "paste", lambda: window.paste_fields_at(rows // 4)
+    yield "undo", window.undo
+    yield "redo", window.redo
+    yield "delete_rows", lambda: window.delete_rows([table.model().index(row, 0) for row in block])
+    yield "undo_delete", window.undo
+
+
+def run_benchmarks(sizes=SIZES, modes=("view",), report=None, **options):
+    from ui.main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    counter = WidgetCounter()
+    app.installEventFilter(counter)
+    results = []
+    try:
+        for mode in modes:
+            for rows in sizes:
+                window = MainWindow(legacy_table=mode == "legacy")
+                window.show()
+                window.set_document(make_document(rows, **options))
+                for name, operation in script(window, rows):
+                    result = measure(app, counter, name, operation)
+                    result.update(mode=mode, rows=rows)
+                    results.append(result)
+                    if report is not None:
+                        report(f"{mode:<7}{name:<20}{rows:>7} righe  {result['seconds'] * 1000:10.2f} ms  "
+                               f"{result['widgets_created']:>7} widget  {result['peak_rss_kb'] // 1024:>6} MB")
+                window.history.clear()
+                window.close()
+                window.deleteLater()
+                app.processEvents()
+    finally:
+        app.removeEventFilter(counter)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.gui_bench",
+                                     description="Benchmark di MainWindow con Qt offscreen su moduli sintetici")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(SIZES), help="numero di righe da provare")
+    parser.add_argument("--mode", nargs="+", choices=("view", "legacy"), default=["view"],
+                        help="tabella model/view o QTableWidget (--legacy-table)")
+    parser.add_argument("--html-size", type=int, default=400, help="caratteri HTML per campo AN")
+    parser.add_argument("--groups", type=int, default=20, help="numero di gruppi (CATEGORIA)")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="quota di codici duplicati (0-1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="file JSON dei risultati (default: stdout)")
+    args = parser.parse_args(argv)
+
+    options = {"html_size": args.html_size, "groups": args.groups, "duplicate_ratio": args.duplicates,
+               "seed": args.seed}
+    results = run_benchmarks(args.rows, args.mode, report=lambda line: print(line, file=sys.stderr), **options)
+    data = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "qpa": os.environ.get("QT_QPA_PLATFORM"), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 **options},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(data, stream, indent=2)
+    else:
+        json.dump(data, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+# benchmarks/synthetic.py
+# Reproducible synthetic forms for the benchmarks: same arguments and seed, same document.
+import random
+
+from core.annotations_presets import beautiful_line
+from core.model import FormDocument, FormField, COLUMNS
+
+TYPES = ("CS", "TE", "AN", "DA")
+
+
+def make_html(size, rnd):
+    # An AN description of about `size` characters
+    words = []
+    length = 0
+    while length < size:
+        word = "".join(rnd.choice("abcdefghilmnoprstuvz") for _ in range(rnd.randint(2, 9)))
+        words.append(word)
+        length += len(word) + 1
+    return f"<p>{' '.join(words)}</p>"
+
+
+def make_fields(rows, html_size=400, groups=20, duplicate_ratio=0.05, seed=0):
+    # duplicate_ratio of the rows reuse an earlier code, so the document has to rename them
+    rnd = random.Random(seed)
+    group_names = [f"GRUPPO_{n}" for n in range(groups)] or [""]
+    fields = []
+    codes = []
+    for n in range(rows):
+        data_type = rnd.choice(TYPES)
+        if codes and rnd.random() < duplicate_ratio:
+            code = rnd.choice(codes)
+        else:
+            code = f"CAMPO_{n}"
+            codes.append(code)
+        if data_type == "AN":
+            description = beautiful_line if rnd.random() < 0.2 else make_html(html_size, rnd)
+        else:
+            description = f"Descrizione del campo {n}"
+        fields.append(FormField(code=code, data_type=data_type, description=description,
+                                mandatory=rnd.random() < 0.3, group=rnd.choice(group_names),
+                                default_data="SI" if data_type == "CS" and rnd.random() < 0.5 else "",
+                                classification=42, linked_field=rnd.choice(codes) if rnd.random() < 0.1 else ""))
+    return fields
+
+
+def make_document(rows, **options):
+    document = FormDocument()
+    document.load_fields(make_fields(rows, **options))
+    return document
+
+
+def make_dataframe(rows, **options):
+    # The shape pd.read_excel gives for a saved workbook
+    import pandas as pd
+    return pd.DataFrame([field.to_row() for field in make_fields(rows, **options)], columns=COLUMNS)
@@ -0,0 +1,91 @@
+# core/batch.py
+# Headless conversion of many workbooks: load, normalize, save. Never imports Qt.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.excel_io import load_excel_file, save_excel_file
+
+EXTENSIONS = (".xlsx", ".xls")
+
+
+def find_workbooks(directory, recursive=False):
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    # skip Excel lock files and our own temporary files
+    return sorted(path for path in paths if path.lower().endswith(EXTENSIONS)
+                  and not os.path.basename(path).startswith(("~$", ".~")) and os.path.isfile(path))
+
+
+def target_path(source, source_dir, output_dir):
+    # Legacy .xls inputs are always written back as .xlsx
+    root, ext = os.path.splitext(source)
+    target = root + ".xlsx" if ext.lower() == ".xls" else source
+    if output_dir is not None:
+        target = os.path.join(output_dir, os.path.relpath(target, source_dir))
+    return target
+
+
+def convert_file(source, target):
+    # load_excel_file already normalizes (ordering, unique codes, classification) through load_fields.
+    # No cache: a batch touches each workbook once, its entries would never be read again.
+    document = load_excel_file(source, use_cache=False)
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    save_excel_file(target, document, use_cache=False)
+    return len(document)
+
+
+def run_batch(source_dir, output_dir=None, workers=None, recursive=False, report=None):
+    # Returns (files converted, rows written, failures as (path, message), seconds)
+    sources = find_workbooks(source_dir, recursive)
+    started = time.perf_counter()
+    converted = rows = 0
+    failures = []
+    if sources:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = {pool.submit(convert_file, source, target_path(source, source_dir, output_dir)): source
+                    for source in sources}
+            for job in as_completed(jobs):
+                source = jobs[job]
+                try:
+                    count = job.result()
+                except Exception as e:
+                    failures.append((source, str(e)))
+                    if report is not None:
+                        report(f"ERRORE {source}: {e}")
+                    continue
+                converted += 1
+                rows += count
+                if report is not None:
+                    report(f"{source}: {count} righe")
+    return converted, rows, failures, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py --batch",
+                                     description="Converte e normalizza in blocco i file Excel Dati Specifici")
+    parser.add_argument("source", help="cartella con i file .xlsx/.xls")
+    parser.add_argument("-o", "--output", help="cartella di destinazione (default: sovrascrive i file)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="processi in parallelo (default: CPU)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="include le sottocartelle")
+    parser.add_argument("-q", "--quiet", action="store_true", help="solo il riepilogo finale")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        parser.error(f"cartella non trovata: {args.source}")
+    converted, rows, failures, seconds = run_batch(
+        args.source, args.output, args.workers, args.recursive, report=None if args.quiet else print)
+    seconds = max(seconds, 1e-9)
+    print(f"{converted} file, {rows} righe in {seconds:.2f}s "
+          f"({converted / seconds:.1f} file/s, {rows / seconds:.0f} righe/s), {len(failures)} errori")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# core/clipboard.py
+# Rows on the system clipboard: a typed JSON payload for other editor instances and TSV text for
+# spreadsheets, both with the workbook columns of FormField.to_row. Never imports Qt; the window
+# puts these on and reads them off the clipboard.
+import csv
+import io
+import json
+
+from core.model import FormField, COLUMNS
+
+MIME_TYPE = "application/x-hypersic-fields"
+FORMAT = "hypersic-fields"
+VERSION = 1
+
+# What a spreadsheet cell may hold for OBBLIGO = no
+_FALSE = {"", "0", "0.0", "falso", "false", "no", "n"}
+# Columns an empty cell leaves unset (None) rather than empty text
+_UNSET_WHEN_EMPTY = ("CLASSIFICAZIONE", "ORDINE", "TIPOLOGIA", "MODULO_HYPERSIC")
+
+
+def fields_to_payload(fields) -> bytes:
+    return json.dumps({"format": FORMAT, "version": VERSION, "columns": COLUMNS,
+                       "rows": [field.to_row() for field in fields]},
+                      ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def fields_from_payload(payload: bytes):
+    data = json.loads(payload.decode("utf-8"))
+    if data.get("format") != FORMAT or data.get("version") != VERSION or data.get("columns") != COLUMNS:
+        raise ValueError("formato non riconosciuto")
+    return [FormField.from_row(row) for row in data["rows"]]
+
+
+def fields_to_tsv(fields) -> str:
+    # Header included, so a paste into Excel lands as a sheet the editor can open again.
+    # Cells with tabs, newlines or quotes are quoted the way Excel does.
+    stream = io.StringIO()
+    writer = csv.writer(stream, dialect=csv.excel_tab, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    writer.writerows(["" if value is None else value for value in field.to_row()] for field in fields)
+    return stream.getvalue()
+
+
+def has_header(text: str):
+    # Cheap check on the first line only: is this TSV with a header row naming CODICE?
+    first = text.partition("\n")[0]
+    return "CODICE" in (cell.strip().strip('"').upper() for cell in first.split("\t"))
+
+
+def fields_from_tsv(text: str):
+    # Rows copied from a spreadsheet, header row included (any columns, any order, CODICE among
+    # them); cells are matched by name. Returns None for any other text: cells without a header
+    # can't be told apart from unrelated text.
+    if not has_header(text):
+        return None
+    try:
+        rows = list(csv.reader(io.StringIO(text), dialect=csv.excel_tab))
+    except csv.Error as e:
+        raise ValueError(str(e))
+    while rows and not any(cell.strip() for cell in rows[-1]):
+        rows.pop()
+    if not rows:
+        return None
+    header = [cell.strip().upper() for cell in rows[0]]
+    if "CODICE" not in header:
+        return None
+    positions = [header.index(column) if column in header else None for column in COLUMNS]
+    rows = rows[1:]
+    empty = [None if column in _UNSET_WHEN_EMPTY else "" for column in COLUMNS]
+    mandatory = COLUMNS.index("OBBLIGO")
+    fields = []
+    for cells in rows:
+        row = [cells[n] if n is not None and n < len(cells) and cells[n] != "" else default
+               for n, default in zip(positions, empty)]
+        row[mandatory] = row[mandatory].strip().lower() not in _FALSE
+        fields.append(FormField.from_row(row))
+    return fields
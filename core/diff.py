@@ -0,0 +1,283 @@
+# core/diff.py
+# Structural diff and three-way merge between FormDocuments. Fields are matched by code and
+# compared on the workbook columns of FormField.to_row, so every difference names the column
+# it changes in the saved file.
+#   python -m core.diff old.xlsx new.xlsx
+#   python -m core.diff --merge base.xlsx ours.xlsx theirs.xlsx -o merged.xlsx
+import argparse
+import sys
+from bisect import bisect_left
+
+from core.model import FormDocument, FormField, COLUMNS
+from core.perf import timed
+
+# ORDINE follows from the position (moves are reported as such) and CLASSIFICAZIONE is one value
+# for the whole document
+DIFF_COLUMNS = [column for column in COLUMNS if column not in ("ORDINE", "CLASSIFICAZIONE")]
+_INDEXES = [COLUMNS.index(column) for column in DIFF_COLUMNS]
+
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"  # possibly changed as well
+CHANGED = "changed"
+
+KIND_LABELS = {ADDED: "aggiunto", REMOVED: "eliminato", MOVED: "spostato", CHANGED: "modificato"}
+
+ORDER = "ORDINE"  # conflict column for moves that disagree
+
+
+def _values(field):
+    row = field.to_row()
+    return tuple(row[n] for n in _INDEXES)
+
+
+def _changed_columns(old_values, new_values):
+    if old_values == new_values:
+        return {}
+    return {column: (old, new) for column, old, new in zip(DIFF_COLUMNS, old_values, new_values) if old != new}
+
+
+def _stable(old_codes, new_rows):
+    # Codes that keep their relative order from old to new. Codes are unique within a document, so
+    # the LCS of the two code sequences is the longest increasing run of new positions taken in old
+    # order: patience sorting, O(n log n).
+    common = [code for code in old_codes if code in new_rows]
+    tails = []  # tails[k]: index in common ending the best increasing run of length k + 1
+    tail_rows = []  # new rows of those, increasing
+    previous = [None] * len(common)
+    for n, code in enumerate(common):
+        row = new_rows[code]
+        k = bisect_left(tail_rows, row)
+        previous[n] = tails[k - 1] if k else None
+        if k == len(tails):
+            tails.append(n)
+            tail_rows.append(row)
+        else:
+            tails[k] = n
+            tail_rows[k] = row
+    stable = set()
+    n = tails[-1] if tails else None
+    while n is not None:
+        stable.add(common[n])
+        n = previous[n]
+    return stable
+
+
+@timed("diff.diff_documents")
+def diff_documents(old: FormDocument, new: FormDocument):
+    # [(kind, code, old row, new row, columns)] in new-document order, removed fields where they
+    # used to be. columns maps each changed column to (old value, new value).
+    old_rows = {field.code: n for n, field in enumerate(old.fields)}
+    new_rows = {field.code: n for n, field in enumerate(new.fields)}
+    stable = _stable(old_rows, new_rows)
+    keyed = []
+    for n, field in enumerate(new.fields):
+        row = old_rows.get(field.code)
+        if row is None:
+            keyed.append((n, (ADDED, field.code, None, n, {})))
+            continue
+        columns = _changed_columns(_values(old.fields[row]), _values(field))
+        if field.code not in stable:
+            keyed.append((n, (MOVED, field.code, row, n, columns)))
+        elif columns:
+            keyed.append((n, (CHANGED, field.code, row, n, columns)))
+    anchor = -1  # new row of the last field before it that stayed in place
+    for n, field in enumerate(old.fields):
+        if field.code in stable:
+            anchor = new_rows[field.code]
+        elif field.code not in new_rows:
+            keyed.append((anchor + 0.5, (REMOVED, field.code, n, None, {})))
+    keyed.sort(key=lambda item: item[0])
+    return [change for _, change in keyed]
+
+
+def _merge_values(code, base, ours, theirs, conflicts):
+    # Column by column: a side that left the base value untouched takes the other side's value
+    if ours == theirs or theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    merged = []
+    for n, column in enumerate(DIFF_COLUMNS):
+        base_value = base[n] if base is not None else None
+        our_value, their_value = ours[n], theirs[n]
+        if our_value == their_value or their_value == base_value:
+            merged.append(our_value)
+        elif our_value == base_value:
+            merged.append(their_value)
+        else:
+            conflicts.append((code, column, base_value, our_value, their_value))
+            merged.append(our_value)
+    return tuple(merged)
+
+
+def _merge_one(code, base, ours, theirs, conflicts):
+    # Merged values of one code, or None when it is dropped. A field removed on one side and changed
+    # on the other is kept as changed, with a conflict on column None.
+    if ours is None and theirs is None:
+        return None
+    if ours is None or theirs is None:
+        present = ours if theirs is None else theirs
+        if base is None:
+            return present
+        if present == base:
+            return None
+        conflicts.append((code, None, base, ours, theirs))
+        return present
+    return _merge_values(code, base, ours, theirs, conflicts)
+
+
+def _move_conflicts(order, base_values, *sides):
+    # A side's move survives when the field still sits between the fields around it on that side.
+    # Where it does not, the other side reordered the same rows differently: one conflict per field.
+    position = {code: n for n, code in enumerate(order)}
+    found = {}
+    for side_order, moved, values in sides:
+        kept = [code for code in side_order if code in position]
+        for n, code in enumerate(kept):
+            if code not in moved or code not in base_values or code in found:
+                continue
+            before = position[kept[n - 1]] if n else -1
+            after = position[kept[n + 1]] if n + 1 < len(kept) else len(order)
+            if not before < position[code] < after:
+                found[code] = None
+    return [(code, ORDER, base_values[code], sides[0][2].get(code), sides[1][2].get(code)) for code in found]
+
+
+@timed("diff.merge_documents")
+def merge_documents(base: FormDocument, ours: FormDocument, theirs: FormDocument):
+    # Three-way merge: (merged FormDocument, [(code, column, base, ours, theirs)] conflicts).
+    # Where both sides changed the same value differently ours wins and the conflict is listed;
+    # the field order is ours, with the fields theirs added or moved placed after the field that
+    # precedes them in theirs.
+    base_values = {field.code: _values(field) for field in base.fields}
+    our_values = {field.code: _values(field) for field in ours.fields}
+    their_values = {field.code: _values(field) for field in theirs.fields}
+    our_order = [field.code for field in ours.fields]
+    their_order = [field.code for field in theirs.fields]
+
+    conflicts = []
+    merged = {}
+    for code in our_order + [code for code in their_order if code not in our_values]:
+        values = _merge_one(code, base_values.get(code), our_values.get(code), their_values.get(code), conflicts)
+        if values is not None:
+            merged[code] = values
+
+    base_order = [field.code for field in base.fields]
+    our_moved = set(our_values) - _stable(base_order, {code: n for n, code in enumerate(our_order)})
+    their_moved = set(their_values) - _stable(base_order, {code: n for n, code in enumerate(their_order)})
+
+    # Ours as a linked list (None is both ends), so theirs' placements cost O(1) each
+    sequence = [code for code in our_order if code in merged]
+    following = dict(zip([None] + sequence, sequence + [None]))
+    preceding = {code: before for before, code in following.items() if code is not None}
+    placed = None
+    for code in their_order:
+        if code not in merged:
+            continue
+        if code not in preceding or (code in their_moved and code in base_values):
+            if code in preceding:
+                if code in our_moved:
+                    # moved on both sides: ours stays, _move_conflicts tells if theirs is lost
+                    placed = code
+                    continue
+                before, after = preceding.pop(code), following.pop(code)
+                following[before] = after
+                if after is not None:
+                    preceding[after] = before
+            after = following[placed]
+            following[placed] = code
+            following[code] = after
+            preceding[code] = placed
+            if after is not None:
+                preceding[after] = code
+        placed = code
+
+    order = []
+    code = following[None]
+    while code is not None:
+        order.append(code)
+        code = following[code]
+    conflicts.extend(_move_conflicts(order, base_values, (our_order, our_moved, our_values),
+                                     (their_order, their_moved, their_values)))
+
+    classification = ours.classification
+    if classification == base.classification:
+        classification = theirs.classification
+    fields = []
+    for code in order:
+        row = [None] * len(COLUMNS)
+        for n, value in zip(_INDEXES, merged[code]):
+            row[n] = value
+        row[0] = classification
+        fields.append(FormField.from_row(row))
+    document = FormDocument()
+    document.load_fields(fields)
+    return document, conflicts
+
+
+def format_changes(changes):
+    lines = []
+    for kind, code, old_row, new_row, columns in changes:
+        where = f"riga {old_row + 1}" if new_row is None else (
+            f"riga {new_row + 1}" if old_row is None or old_row == new_row else f"riga {old_row + 1} -> {new_row + 1}")
+        lines.append(f"{KIND_LABELS[kind]:<10} {code} ({where})")
+        for column, (old, new) in columns.items():
+            lines.append(f"    {column}: {short_value(old)} -> {short_value(new)}")
+    return lines
+
+
+def format_conflicts(conflicts):
+    lines = []
+    for code, column, base, ours, theirs in conflicts:
+        if column is None:
+            lines.append(f"conflitto  {code}: eliminato da una parte, modificato dall'altra")
+        elif column == ORDER:
+            lines.append(f"conflitto  {code}: spostato in modo diverso dalle due parti")
+        else:
+            lines.append(f"conflitto  {code} {column}: base {short_value(base)}, nostro {short_value(ours)}, "
+                         f"loro {short_value(theirs)}")
+    return lines
+
+
+def short_value(value, width=60):
+    text = repr(value)
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def _load(path):
+    from core.project import PROJECT_EXTENSION, load_project
+    from core.excel_io import load_excel_file
+    return load_project(path) if path.lower().endswith(PROJECT_EXTENSION) else load_excel_file(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.diff",
+                                     description="Confronta due file Dati Specifici o ne unisce tre versioni")
+    parser.add_argument("paths", nargs="+", help="vecchio nuovo, oppure con --merge: base nostro loro")
+    parser.add_argument("-m", "--merge", action="store_true", help="unione a tre vie")
+    parser.add_argument("-o", "--output", help="dove salvare il risultato dell'unione (.xlsx o .hsf)")
+    args = parser.parse_args(argv)
+
+    if len(args.paths) != (3 if args.merge else 2):
+        parser.error("servono 3 file con --merge, altrimenti 2")
+    documents = [_load(path) for path in args.paths]
+    if not args.merge:
+        changes = diff_documents(*documents)
+        print("\n".join(format_changes(changes)) or "nessuna differenza")
+        return 1 if changes else 0
+
+    document, conflicts = merge_documents(*documents)
+    if conflicts:
+        print("\n".join(format_conflicts(conflicts)))
+    if args.output:
+        from core.project import PROJECT_EXTENSION, save_project
+        from core.excel_io import save_excel_file
+        save = save_project if args.output.lower().endswith(PROJECT_EXTENSION) else save_excel_file
+        save(args.output, document)
+    print(f"{len(document)} campi, {len(conflicts)} conflitti")
+    return 1 if conflicts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,181 @@
 # core/excel_io.py
-import pandas as pd
-from core.model import FormDocument
+import os
+import shutil
+import tempfile
 
+from core.model import FormDocument, FormField, COLUMNS
+from core.perf import timed, count
+from core.project import load_cached, store_cached
 
-def load_excel_file(path: str) -> FormDocument:
+# Rows between two progress callbacks / cancellation checks
+PROGRESS_EVERY = 500
+
+# Workbook column -> FormField argument, for the columns the reader keeps
+FIELD_COLUMNS = {
+    "CODICE": "code",
+    "TIPOLOGIA": "data_type",
+    "DESCRIZIONE": "description",
+    "OBBLIGO": "mandatory",
+    "CATEGORIA": "group",
+    "DATI": "default_data",
+    "CLASSIFICAZIONE": "classification",
+    "ANNOTAZIONI": "annotation",
+    "MODULO_HYPERSIC": "hypersic_module",
+    "CAMPO_COLLEGATO": "linked_field",
+    "LINKED_FIELD": "linked_field",
+}
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+def _track(items, total, progress, cancelled):
+    # Passes items through, calling progress(done, total) and checking cancelled() every PROGRESS_EVERY
+    done = 0
+    for done, item in enumerate(items, 1):
+        if done % PROGRESS_EVERY == 0:
+            if cancelled is not None and cancelled():
+                raise OperationCancelled()
+            if progress is not None:
+                progress(done, total)
+        yield item
+    if progress is not None:
+        progress(done, total)
+
+
+def _text(value):
+    return value if isinstance(value, str) else ""
+
+
+def _number(value):
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    if isinstance(value, (int, float)) and value == value:
+        return int(value)
+    return None
+
+
+def _flag(value):
+    return bool(_number(value))
+
+
+NORMALIZERS = {
+    "code": _text,
+    "data_type": _text,
+    "description": _text,
+    "mandatory": _flag,
+    "group": _text,
+    "default_data": _text,
+    "classification": _number,
+    "annotation": _text,
+    "hypersic_module": lambda value: value,
+    "linked_field": _text,
+}
+
+
+def iter_excel_records(path: str, progress=None, cancelled=None):
+    # Streams the first sheet with openpyxl in read-only mode and yields one dict of
+    # normalized FormField arguments per row; only the known columns are looked at.
+    from openpyxl import load_workbook  # imported on first use, it is slow to load
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row - 1 if sheet.max_row else None  # from the sheet's dimension tag, if any
+        rows = sheet.iter_rows(values_only=True)
+        header = [name.strip() if isinstance(name, str) else name for name in next(rows, ())]
+        columns = [(n, FIELD_COLUMNS[name]) for n, name in enumerate(header)
+                   if name in FIELD_COLUMNS and not (name == "LINKED_FIELD" and "CAMPO_COLLEGATO" in header)]
+        defaults = {attr: normalize(None) for attr, normalize in NORMALIZERS.items()}
+        for row in _track(rows, total, progress, cancelled):
+            values = [(attr, row[n] if n < len(row) else None) for n, attr in columns]
+            if all(value is None for _, value in values):
+                continue
+            record = dict(defaults)
+            for attr, value in values:
+                record[attr] = NORMALIZERS[attr](value)
+            yield record
+    finally:
+        workbook.close()
+
+
+@timed("excel_io.load_excel_file")
+def load_excel_file(path: str, progress=None, cancelled=None, use_cache=True) -> FormDocument:
+    # progress(rows_done, rows_total_or_None) and cancelled() -> bool are optional hooks for
+    # callers running this off the GUI thread; a cancelled load raises OperationCancelled.
+    # A workbook unchanged since it was last read or written comes from the cache instead.
+    if use_cache:
+        document = load_cached(path)
+        count("excel_io.cache_hit" if document is not None else "excel_io.cache_miss")
+        if document is not None:
+            if progress is not None:
+                progress(len(document), len(document))
+            return document
     document = FormDocument()
     try:
-        df = pd.read_excel(path)
-        document.load_from_dataframe(df)
-        return document
+        if path.lower().endswith(".xls"):
+            # legacy binary workbooks are not readable by openpyxl
+            import pandas as pd
+            document.load_from_dataframe(pd.read_excel(path))
+        else:
+            document.load_fields(
+                FormField(**record) for record in iter_excel_records(path, progress=progress, cancelled=cancelled))
+        count("excel_io.rows_read", len(document))
+    except OperationCancelled:
+        raise
     except Exception as e:
         raise RuntimeError(f"Error reading Excel file: {e}")
+    if use_cache:
+        store_cached(path, document)
+    return document
+
+
+@timed("excel_io.save_excel_file")
+def _copy_mode(target, temp):
+    # The temporary file is created 0600; the saved workbook keeps the permissions of the file it
+    # replaces, or gets the umask default a new file would have had
+    if os.path.exists(target):
+        shutil.copymode(target, temp)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp, 0o666 & ~umask)
+
 
+def save_excel_file(path: str, document: FormDocument, atomic: bool = True, progress=None, cancelled=None,
+                    use_cache=True):
+    # Rows go straight from the document into a write-only workbook. With atomic=True the
+    # workbook is written next to the target and renamed over it only once complete.
+    # The saved document is cached, so reopening the file right after needs no parsing.
+    from openpyxl import Workbook
 
-def save_excel_file(path: str, document: FormDocument):
+    target = path
+    if atomic:
+        # a name of its own per save: two saves of the same target, even from one process, never
+        # write the same temporary file
+        directory, name = os.path.split(os.path.abspath(target))
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=f".~{name}.", suffix=".tmp", delete=False) as stream:
+            path = stream.name
     try:
-        df = pd.DataFrame(document.export_to_dataframe())
-        df.to_excel(path, index=False)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append(COLUMNS)
+        for row in _track(document.export_rows(), len(document), progress, cancelled):
+            sheet.append([None if value == "" else value for value in row])
+        workbook.save(path)
+        count("excel_io.rows_written", len(document))
+        if atomic:
+            _copy_mode(target, path)
+            os.replace(path, target)
     except Exception as e:
-        raise RuntimeError(f"Error writing Excel file: {e}")
\ No newline at end of file
+        if atomic and os.path.exists(path):
+            os.remove(path)
+        if isinstance(e, OperationCancelled):
+            raise
+        raise RuntimeError(f"Error writing Excel file: {e}")
+    if use_cache:
+        store_cached(target, document)
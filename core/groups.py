@@ -0,0 +1,88 @@
+# core/groups.py
+# Group (CATEGORIA) index over a FormDocument, kept current through the document's observers,
+# and the bulk group operations built on it. Each operation is a single undo command.
+from core.model import FormDocument
+from core.undo import SetValues, MoveFields
+
+
+class GroupIndex:
+    def __init__(self, document: FormDocument):
+        self.document = document
+        self._members = {}  # group name -> set of fields
+        self._group_of = {}  # field -> group name it is filed under
+        self.rebuild()
+        document.observers.append(self._on_change)
+
+    def close(self):
+        if self._on_change in self.document.observers:
+            self.document.observers.remove(self._on_change)
+
+    def rebuild(self):
+        self._members.clear()
+        self._group_of.clear()
+        for field in self.document.fields:
+            self._add(field)
+
+    def names(self):
+        # Named groups only; fields without a group are under ""
+        return sorted(name for name in self._members if name)
+
+    def fields(self, group):
+        return set(self._members.get(group, ()))
+
+    def rows(self, group):
+        # Current positions, in document order
+        return sorted(field.order // 100 for field in self._members.get(group, ()))
+
+    def __len__(self):
+        return len(self._members)
+
+    def rename(self, group, new_name) -> SetValues:
+        return self._set(group, "group", new_name, f"Rinomina gruppo {group}")
+
+    def move(self, group, destination) -> MoveFields:
+        # Gathers the whole group, in its current order, right before row `destination`
+        command = MoveFields(self.rows(group), destination)
+        command.label = f"Sposta gruppo {group}"
+        return command
+
+    def set_mandatory(self, group, mandatory) -> SetValues:
+        return self._set(group, "mandatory", bool(mandatory), f"Obbligatorietà gruppo {group}")
+
+    def set_type(self, group, data_type) -> SetValues:
+        return self._set(group, "data_type", data_type, f"Tipologia gruppo {group}")
+
+    def set_default_data(self, group, default_data) -> SetValues:
+        return self._set(group, "default_data", default_data, f"Dati di default gruppo {group}")
+
+    def _set(self, group, attr, value, label):
+        command = SetValues(self.rows(group), attr, value)
+        command.label = label
+        return command
+
+    def _add(self, field):
+        group = field.group or ""
+        members = self._members.get(group)
+        if members is None:
+            self._members[group] = members = set()
+        members.add(field)
+        self._group_of[field] = group
+
+    def _remove(self, field):
+        group = self._group_of.pop(field, None)
+        if group is not None:
+            members = self._members[group]
+            members.discard(field)
+            if not members:
+                del self._members[group]
+
+    def _on_change(self, event, fields, attr):
+        if event == "reset":
+            self.rebuild()
+        elif event == "removed":
+            for field in fields:
+                self._remove(field)
+        elif event == "added" or attr == "group":
+            for field in fields:
+                self._remove(field)
+                self._add(field)
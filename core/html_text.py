@@ -0,0 +1,82 @@
+# core/html_text.py
+# Plain-text views of the HTML kept in AN descriptions, without going through Qt's HTML parser.
+import html
+import re
+from collections import OrderedDict
+
+PREVIEW_LENGTH = 200  # characters kept for a table cell
+MAX_PREVIEWS = 20000
+
+_HIDDEN = re.compile(r"<(head|script|style|title)\b.*?</\1\s*>|<!--.*?-->|<!DOCTYPE[^>]*>",
+                     re.DOTALL | re.IGNORECASE)
+_RULE = re.compile(r"<hr\b[^>]*>", re.IGNORECASE)
+_BREAK = re.compile(r"<(br|/p|/div|/li|/tr|/h[1-6])\b[^>]*>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]*>")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+_LINES = re.compile(r"\s*\n\s*")
+
+_previews = OrderedDict()  # (hash, length) of a description -> its preview
+
+
+def plain_text(markup: str) -> str:
+    # Text content with one line per block; horizontal rules become a row of dashes
+    if "<" not in markup:
+        return html.unescape(markup).strip()
+    text = _HIDDEN.sub("", markup)
+    text = _RULE.sub("\n———\n", text)
+    text = _BREAK.sub("\n", text)
+    text = html.unescape(_TAG.sub("", text))
+    return _LINES.sub("\n", _SPACES.sub(" ", text)).strip()
+
+
+def preview(markup: str, length: int = PREVIEW_LENGTH) -> str:
+    # One-line plain text, cut at `length`. Cached by content, so an edited description simply
+    # gets a new entry and the old one ages out.
+    key = (hash(markup), len(markup))
+    text = _previews.get(key)
+    if text is None:
+        text = plain_text(markup).replace("\n", " ⏎ ")
+        if len(text) > length:
+            text = text[:length - 1] + "…"
+        _previews[key] = text
+        if len(_previews) > MAX_PREVIEWS:
+            _previews.popitem(last=False)
+    else:
+        _previews.move_to_end(key)
+    return text
+
+
+_BODY = re.compile(r"<body([^>]*)>(.*?)</body>", re.DOTALL | re.IGNORECASE)
+_STYLE = re.compile(r'\sstyle="([^"]*)"', re.IGNORECASE)
+_FRAGMENT_MARKS = re.compile(r"<!--(Start|End)Fragment-->")
+_BARE_SPAN = re.compile(r"<span>(.*?)</span>", re.DOTALL)
+
+# Declarations QTextDocument.toHtml() writes on every block although they only restate the defaults
+REDUNDANT_DECLARATIONS = {"-qt-block-indent:0", "text-indent:0px", "-qt-user-state:0"}
+
+
+def _declarations(style):
+    return [":".join(part.strip() for part in declaration.split(":", 1))
+            for declaration in style.split(";") if declaration.strip()]
+
+
+def normalize_fragment(markup: str) -> str:
+    # Canonical, compact fragment for what the rich text editor produced: only the body content,
+    # without Qt's fragment markers, default-restating declarations or the body's own font repeated
+    # on spans. Running it again on its own output changes nothing.
+    body = _BODY.search(markup)
+    if body is not None:
+        attributes = _STYLE.search(body.group(1))
+        defaults = set(_declarations(attributes.group(1))) if attributes else set()
+        markup = body.group(2)
+    else:
+        defaults = set()
+    markup = _FRAGMENT_MARKS.sub("", markup)
+
+    def clean(match):
+        kept = [declaration for declaration in _declarations(match.group(1))
+                if declaration not in REDUNDANT_DECLARATIONS and declaration not in defaults]
+        return f' style="{"; ".join(kept)}"' if kept else ""
+
+    markup = _STYLE.sub(clean, markup)
+    return _BARE_SPAN.sub(r"\1", markup).strip()
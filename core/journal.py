@@ -0,0 +1,253 @@
+# core/journal.py
+# Crash recovery for the open document. Every FormDocument change is recorded with the arguments
+# that replay it and appended, one JSON line per change, to a journal file by a background
+# thread. That thread replays the changes on its own copy of the document, so folding the journal
+# into a snapshot never reads the live document. A recovered document is the snapshot plus the
+# journal lines written after it.
+# Set HYPERSIC_AUTOSAVE_DIR to move the files, HYPERSIC_NO_AUTOSAVE=1 to turn autosave off.
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from core.model import FormDocument, FormField, COLUMNS
+from core.project import CACHE_DIR, document_to_dict, document_from_dict, _write_json
+
+AUTOSAVE_DIR = os.environ.get("HYPERSIC_AUTOSAVE_DIR") or os.path.join(CACHE_DIR, "autosave")
+AUTOSAVE_ENABLED = not os.environ.get("HYPERSIC_NO_AUTOSAVE")
+
+# Changes between two snapshots; past this the writer folds the journal into a new snapshot
+COMPACT_EVERY = 1000
+
+SNAPSHOT_SUFFIX = ".snapshot.json"
+JOURNAL_SUFFIX = ".journal"
+
+_TYPE = COLUMNS.index("TIPOLOGIA")
+
+_SNAPSHOT = object()  # queue item: (seq, _SNAPSHOT, document copy)
+_STOP = object()
+
+_sessions = itertools.count()
+
+
+def _encode(name, args):
+    # FormFields are written as to_row lists, everything else is already plain data
+    if name == "insert_many":
+        position, fields = args
+        return [position, [list(field.to_row()) for field in fields]]
+    if name == "add_field":
+        field, position = args
+        return [list(field.to_row()), position]
+    return list(args)
+
+
+def _decode(row):
+    # from_row makes every FL field CS; the editor allows other types there (the validator flags
+    # them), so the recorded type is put back or replays would drift from the live document
+    field = FormField.from_row(row)
+    if isinstance(row[_TYPE], str):
+        field.data_type = sys.intern(row[_TYPE])
+    return field
+
+
+def apply(document: FormDocument, name, args):
+    # Replays one journal entry
+    if name == "insert_many":
+        document.insert_many(args[0], [_decode(row) for row in args[1]])
+    elif name == "add_field":
+        document.add_field(_decode(args[0]), args[1])
+    else:
+        getattr(document, name)(*args)
+
+
+class Journal:
+    # One per window. record() is all the GUI thread pays for a change: the arguments are turned
+    # into plain data and queued.
+    def __init__(self, directory=AUTOSAVE_DIR):
+        self.directory = directory
+        self.session = f"{os.getpid()}-{int(time.time() * 1000)}-{next(_sessions)}"
+        self.document = None
+        self.error = None  # why writing stopped, if it did; attach() starts over from a new snapshot
+        # Called from the writer thread with the error when writing stops, and with None when a
+        # new snapshot got it going again
+        self.listener = None
+        self._seq = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name=f"journal {self.session}", daemon=True)
+        self._thread.start()
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, self.session + SNAPSHOT_SUFFIX)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.directory, self.session + JOURNAL_SUFFIX)
+
+    def attach(self, document: FormDocument):
+        # Starts journaling `document` from a snapshot of its current state: O(document), once per
+        # load, not per change
+        if self.document is not None and self.document is not document:
+            self.document.journal = None
+        self.document = document
+        document.journal = self
+        self._queue.put((self._seq, _SNAPSHOT, document.copy()))
+
+    def record(self, name, *args):
+        self._seq += 1
+        self._queue.put((self._seq, name, _encode(name, args)))
+
+    def flush(self):
+        # Waits until everything recorded so far is on disk
+        self._queue.join()
+
+    def close(self, discard=True):
+        # A clean close leaves nothing to recover
+        self.listener = None
+        if self.document is not None:
+            self.document.journal = None
+            self.document = None
+        self._queue.put((None, _STOP, None))
+        self._thread.join()
+        if discard:
+            for path in (self.journal_path, self.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _write_loop(self):
+        shadow = stream = None
+        pending = 0  # changes written since the last snapshot
+        last = 0  # sequence number of the last change applied to shadow
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                lines = []
+                for seq, name, args in items:
+                    if name is _STOP:
+                        stopping = True
+                    elif name is _SNAPSHOT:
+                        # covers every line queued before it, which can be dropped; after a
+                        # failure it is the retry, and a new failure is reported again
+                        failed, self.error = self.error is not None, None
+                        shadow, last, lines = args, seq, []
+                        stream = self._write_snapshot(shadow, last, stream)
+                        pending = 0
+                        if failed:
+                            self._tell(None)
+                    elif self.error is not None:
+                        continue
+                    else:
+                        apply(shadow, name, args)
+                        last = seq
+                        lines.append(json.dumps([seq, name, args], ensure_ascii=False, default=str))
+                if lines:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                    os.fsync(stream.fileno())
+                    pending += len(lines)
+                    if pending >= COMPACT_EVERY:
+                        stream = self._write_snapshot(shadow, last, stream)
+                        pending = 0
+            except Exception as e:
+                if self.error is None:
+                    self.error = str(e) or type(e).__name__
+                    self._tell(self.error)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+        if stream is not None:
+            stream.close()
+
+    def _tell(self, error):
+        if self.listener is not None:
+            self.listener(error)
+
+    def _write_snapshot(self, document, seq, stream):
+        # Snapshot first, on disk before the journal is emptied: lines a crash leaves in between
+        # carry sequence numbers the snapshot already covers and are skipped on recovery.
+        # Returns the journal stream to append to from now on.
+        os.makedirs(self.directory, exist_ok=True)
+        data = document_to_dict(document)
+        data.update(session=self.session, seq=seq, saved=time.time())
+        _write_json(self.snapshot_path, data, durable=True)
+        if stream is not None:
+            stream.close()
+        return open(self.journal_path, "w", encoding="utf-8")
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if handle:
+            ctypes.windll.kernel32.CloseHandle(handle)
+            return True
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def pending_sessions(directory=AUTOSAVE_DIR):
+    # [(session, time of the last change, fields in the snapshot)] left behind by processes that are no longer running
+    if not os.path.isdir(directory):
+        return []
+    sessions = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SNAPSHOT_SUFFIX):
+            continue
+        session = name[:-len(SNAPSHOT_SUFFIX)]
+        try:
+            if _alive(int(session.split("-")[0])):
+                continue
+            with open(os.path.join(directory, name), encoding="utf-8") as stream:
+                data = json.load(stream)
+            journal_path = os.path.join(directory, session + JOURNAL_SUFFIX)
+            saved = os.path.getmtime(journal_path) if os.path.exists(journal_path) else data["saved"]
+            sessions.append((session, saved, len(data["rows"])))
+        except (OSError, ValueError, KeyError):
+            continue
+    return sessions
+
+
+def recover(session, directory=AUTOSAVE_DIR) -> FormDocument:
+    # The snapshot with the journal replayed on top; a last line cut short by the crash is dropped
+    with open(os.path.join(directory, session + SNAPSHOT_SUFFIX), encoding="utf-8") as stream:
+        data = json.load(stream)
+    document = document_from_dict(data)
+    for field, row in zip(document.fields, data["rows"]):  # load_fields keeps the order
+        if isinstance(row[_TYPE], str):
+            field.data_type = sys.intern(row[_TYPE])
+    journal_path = os.path.join(directory, session + JOURNAL_SUFFIX)
+    if os.path.exists(journal_path):
+        with open(journal_path, encoding="utf-8") as stream:
+            for line in stream:
+                try:
+                    seq, name, args = json.loads(line)
+                except ValueError:
+                    break
+                if seq > data["seq"]:
+                    apply(document, name, args)
+    return document
+
+
+def discard(session, directory=AUTOSAVE_DIR):
+    for suffix in (SNAPSHOT_SUFFIX, JOURNAL_SUFFIX):
+        path = os.path.join(directory, session + suffix)
+        if os.path.exists(path):
+            os.remove(path)
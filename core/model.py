@@ -1,5 +1,8 @@
 # core/model.py
+import sys
+
 from core.annotations_presets import beautiful_line
+from core.perf import timed
 
 FIELD_TYPES = {
     "Casella di selezione": "CS",
@@ -8,24 +11,40 @@ FIELD_TYPES = {
     "Data": "DA"
 }
 
+# Workbook columns, in the order FormField.to_dict writes them
+COLUMNS = [
+    "CLASSIFICAZIONE", "ORDINE", "CODICE", "DESCRIZIONE", "CATEGORIA", "OBBLIGO", "TIPOLOGIA", "DATI",
+    "ANNOTAZIONI", "MODULO_HYPERSIC", "CAMPO_COLLEGATO"
+]
+
+
+# Attributes drawn from a small vocabulary: one shared string object per distinct value
+INTERNED_ATTRIBUTES = ("data_type", "group")
+# HTML/text payloads that repeat across fields (presets, disclaimers): shared per document
+SHARED_ATTRIBUTES = ("description", "annotation")
+
 
 class FormField:
+    # Slots instead of a per-instance __dict__: a 10k-row document holds 10k of these
+    __slots__ = ("code", "data_type", "description", "group", "mandatory", "default_data", "classification",
+                 "order", "annotation", "hypersic_module", "linked_field")
+
     def __init__(self, code: str, data_type: str, description: str, mandatory: int, group=None, default_data: str=None,
                  classification: int = None, order: int = 0, annotation: str = "", hypersic_module=None,
                  linked_field: str = ""):
         self.code = code if isinstance(code, str) else ""  # Unique identifier (e.g., FIGLIO_COGNOME)
-        self.data_type = data_type if isinstance(data_type, str) else "TE"  # "CS", "TE", or "AN"
+        self.data_type = sys.intern(data_type) if isinstance(data_type, str) else "TE"  # "CS", "TE", or "AN"
         self.description = description if isinstance(description, str) else ""  # Display text or HTML (for AN)
-        self.group = group if isinstance(group, str) else ""  # Optional logical group
+        self.group = sys.intern(group) if isinstance(group, str) else ""  # Optional logical group
         self.mandatory = mandatory
         self.default_data = default_data if isinstance(default_data, str) else ""
         self.classification = classification
-        self.order = order,
+        self.order = order
         self.annotation = annotation
         self.hypersic_module = hypersic_module
         self.linked_field = linked_field
 
-        if code.startswith("FL"):
+        if self.code.startswith("FL"):
             self.data_type = "CS"
 
     def to_dict(self):
@@ -43,20 +62,47 @@ class FormField:
             "CAMPO_COLLEGATO": self.linked_field
         }
 
-    def copy(self):
-        return FormField(
-            code=self.code,
-            data_type=self.data_type,
-            description=self.description,
-            mandatory=self.mandatory,
-            group=self.group,
-            default_data=self.default_data,
-            classification=self.classification,
-            annotation=self.annotation,
-            linked_field=self.linked_field,
-            hypersic_module=self.hypersic_module
+    def to_row(self):
+        # Same values as to_dict, in COLUMNS order
+        return (
+            self.classification,
+            self.order,
+            self.code,
+            self.description,
+            self.group or "",
+            -1 if self.mandatory else 0,
+            self.data_type,
+            self.default_data,
+            self.annotation,
+            self.hypersic_module,
+            self.linked_field
         )
 
+    @staticmethod
+    def from_row(row):
+        # Inverse of to_row; ORDINE is ignored, positions are set by the document
+        classification, _, code, description, group, mandatory, data_type, default_data, annotation, module, \
+            linked_field = row
+        return FormField(code=code, data_type=data_type, description=description, mandatory=bool(mandatory),
+                         group=group, default_data=default_data, classification=classification,
+                         annotation=annotation, hypersic_module=module, linked_field=linked_field)
+
+    def copy(self):
+        # Values are already normalized, so __init__ is skipped; strings are shared, not duplicated
+        cp = FormField.__new__(FormField)
+        cp.code = self.code
+        cp.data_type = self.data_type
+        cp.description = self.description
+        cp.group = self.group
+        cp.mandatory = self.mandatory
+        cp.default_data = self.default_data
+        cp.classification = self.classification
+        cp.order = self.order
+        cp.annotation = self.annotation
+        cp.hypersic_module = self.hypersic_module
+        cp.linked_field = self.linked_field
+        return cp
+
     def __str__(self):
         return f" {self.code}\t{self.data_type}\t{self.mandatory}\t{self.group or ""}"
 
@@ -80,87 +126,417 @@ class FormDocument:
     def __init__(self):
         self.fields = []  # List of FormField
         self.classification = None
+        self._codes = {}  # code -> FormField currently owning it
+        self._suffixes = {}  # code -> lowest number of "*" that may still be free for it
+        self._payloads = {}  # description/annotation text -> the one string object fields point at
+        self._payload_uses = {}  # text -> live field attributes holding it; dropped at zero
+        # Callables observer(event, fields, attr) told about content changes, for indexes kept
+        # beside the document. event is "added", "removed", "changed" (attr set) or "reset";
+        # moves are not reported, positions always follow from field.order.
+        self.observers = []
+        # core.journal.Journal told about every change, with the arguments to replay it
+        self.journal = None
 
     def __str__(self):
-        result = ""
-        for n, i in enumerate(self.fields):
-            result += str(n) + str(i) + "\n"
-        return result
+        return "".join(f"{n}{field}\n" for n, field in enumerate(self.fields))
 
+    @timed("FormDocument.copy")
     def copy(self):
+        # Orders and codes are kept consistent, so the copy inherits them without a _refresh pass
         cp = FormDocument()
         cp.classification = self.classification
         cp.fields = [field.copy() for field in self.fields]
+        cp._codes = {field.code: field for field in cp.fields}
+        cp._suffixes = dict(self._suffixes)
+        cp._payloads = dict(self._payloads)
+        cp._payload_uses = dict(self._payload_uses)
         return cp
 
+    @timed("FormDocument.add_field")
     def add_field(self, field: FormField, position=None):
-        if position is None:
-            self.fields.append(field)
-        else:
-            self.fields.insert(position, field)
-        self._refresh()
+        if self.journal is not None:
+            self.journal.record("add_field", field, position)
+        if position is None or position > len(self.fields):
+            position = len(self.fields)
+        elif position < 0:
+            position = max(len(self.fields) + position, 0)
+        self.fields.insert(position, field)
+        field.classification = self.classification
+        self._share(field)
+        self._renumber(position)
+        self._claim_code(field)
+        if self.observers:
+            self._notify("added", [field])
 
+    @timed("FormDocument.remove_field")
     def remove_field(self, index: int):
+        if self.journal is not None:
+            self.journal.record("remove_field", index)
         if 0 <= index < len(self.fields):
-            del self.fields[index]
-        self._refresh()
+            field = self.fields.pop(index)
+            self._release_code(field)
+            self._unshare(field)
+            self._renumber(index)
+            if self.observers:
+                self._notify("removed", [field])
 
+    @timed("FormDocument.swap_field")
     def swap_field(self, index_1, index_2):
+        if self.journal is not None:
+            self.journal.record("swap_field", index_1, index_2)
         if 0 <= index_1 < len(self.fields) and 0 <= index_2 < len(self.fields):
             self.fields[index_1], self.fields[index_2] = self.fields[index_2], self.fields[index_1]
-        self._refresh()
+            self.fields[index_1].order = index_1 * 100
+            self.fields[index_2].order = index_2 * 100
+            # codes are already unique, so a swap never needs a rename
+
+    @timed("FormDocument.insert_many")
+    def insert_many(self, position, fields):
+        # One renumbering pass for the whole block; returns the (field, old code) pairs of
+        # existing fields that had to give their code to an earlier inserted one.
+        fields = list(fields)
+        position = max(0, min(len(self.fields), position))
+        if self.journal is not None:
+            self.journal.record("insert_many", position, fields)
+        self.fields[position:position] = fields
+        self._renumber(position)
+        displaced = []
+        for field in fields:
+            field.classification = self.classification
+            self._share(field)
+            renamed = self._claim_code(field)
+            if renamed is not None:
+                displaced.append(renamed)
+        if self.observers:
+            self._notify("added", fields)
+        return displaced
+
+    @timed("FormDocument.delete_many")
+    def delete_many(self, rows):
+        rows = sorted(set(row for row in rows if 0 <= row < len(self.fields)))
+        if not rows:
+            return []
+        if self.journal is not None:
+            self.journal.record("delete_many", rows)
+        removed = [self.fields[row] for row in rows]
+        for field in removed:
+            self._release_code(field)
+            self._unshare(field)
+        if rows[-1] - rows[0] + 1 == len(rows):
+            del self.fields[rows[0]:rows[-1] + 1]
+        else:
+            doomed = set(rows)
+            self.fields = [field for n, field in enumerate(self.fields) if n not in doomed]
+        self._renumber(rows[0])
+        if self.observers:
+            self._notify("removed", removed)
+        return removed
+
+    @timed("FormDocument.move_block")
+    def move_block(self, rows, destination):
+        # Gathers rows (in their order) right before `destination`, given in pre-move positions.
+        # Returns the row where the block now starts.
+        rows = sorted(set(row for row in rows if 0 <= row < len(self.fields)))
+        if not rows:
+            return destination
+        if self.journal is not None:
+            self.journal.record("move_block", rows, destination)
+        start = destination - sum(1 for row in rows if row < destination)
+        if rows[-1] - rows[0] + 1 == len(rows):
+            moved = self.fields[rows[0]:rows[-1] + 1]
+            del self.fields[rows[0]:rows[-1] + 1]
+        else:
+            picked = set(rows)
+            moved = [self.fields[row] for row in rows]
+            self.fields = [field for n, field in enumerate(self.fields) if n not in picked]
+        self.fields[start:start] = moved
+        self._renumber(min(rows[0], start), max(rows[-1], start + len(rows) - 1) + 1)
+        return start
+
+    @timed("FormDocument.restore_block")
+    def restore_block(self, start, rows):
+        # Inverse of move_block: spreads the block beginning at `start` back onto `rows`
+        rows = sorted(set(rows))
+        if self.journal is not None:
+            self.journal.record("restore_block", start, rows)
+        moved = self.fields[start:start + len(rows)]
+        rest = self.fields[:start] + self.fields[start + len(rows):]
+        fields = []
+        moved_it, rest_it = iter(moved), iter(rest)
+        targets = set(rows)
+        for n in range(len(self.fields)):
+            fields.append(next(moved_it) if n in targets else next(rest_it))
+        self.fields = fields
+        self._renumber(min(rows[0], start), max(rows[-1], start + len(rows) - 1) + 1)
+
+    @timed("FormDocument.shift_rows")
+    def shift_rows(self, rows, direction):
+        # Moves every row one step up (-1) or down (+1), like repeated swaps with the neighbour
+        rows = sorted(set(rows), reverse=direction > 0)
+        if not rows or not 0 <= rows[0] + direction < len(self.fields) or \
+                not 0 <= rows[-1] + direction < len(self.fields):
+            return False
+        for row in rows:
+            self.swap_field(row, row + direction)
+        return True
+
+    @timed("FormDocument.set_code")
+    def set_code(self, index: int, code: str):
+        if 0 <= index < len(self.fields):
+            field = self.fields[index]
+            if field.code != code:
+                if self.journal is not None:
+                    self.journal.record("set_code", index, code)
+                self._release_code(field)
+                field.code = code
+                displaced = self._claim_code(field)
+                if self.observers:
+                    self._notify("changed", [field], "code")
+                return displaced
+
+    def field_by_code(self, code):
+        return self._codes.get(code)
+
+    @timed("FormDocument.set_value")
+    def set_value(self, index: int, attr: str, value):
+        # Single-attribute edit: only the code index is touched, and only for code changes
+        if not 0 <= index < len(self.fields):
+            return
+        if attr == "code":
+            return self.set_code(index, value)
+        if self.journal is not None:
+            self.journal.record("set_value", index, attr, value)
+        field = self.fields[index]
+        value = self._normalized(attr, value)
+        if attr in SHARED_ATTRIBUTES:
+            self._drop_payload(getattr(field, attr))
+        setattr(field, attr, value)
+        if self.observers:
+            self._notify("changed", [self.fields[index]], attr)
+
+    @timed("FormDocument.set_values")
+    def set_values(self, rows, attr: str, values):
+        # set_value for many rows (values aligned with rows) with a single notification.
+        # Returns the (field, old code) pairs displaced by code changes, which still go one by one.
+        if attr == "code":
+            return [displaced for displaced in (self.set_code(row, value) for row, value in zip(rows, values))
+                    if displaced is not None]
+        if self.journal is not None:
+            rows, values = list(rows), list(values)
+            self.journal.record("set_values", rows, attr, values)
+        changed = []
+        for row, value in zip(rows, values):
+            if 0 <= row < len(self.fields):
+                field = self.fields[row]
+                value = self._normalized(attr, value)
+                if attr in SHARED_ATTRIBUTES:
+                    self._drop_payload(getattr(field, attr))
+                setattr(field, attr, value)
+                changed.append(field)
+        if changed and self.observers:
+            self._notify("changed", changed, attr)
+        return []
+
+    def _normalized(self, attr, value):
+        if attr == "mandatory":
+            return bool(value)
+        if attr in INTERNED_ATTRIBUTES and isinstance(value, str):
+            return sys.intern(value)
+        if attr in SHARED_ATTRIBUTES:
+            return self._take_payload(value)
+        return value
 
     def update_group(self, indexes: list[int], group_value: str):
+        if self.journal is not None:
+            self.journal.record("update_group", indexes, group_value)
         for idx in indexes:
             if 0 <= idx < len(self.fields):
                 self.fields[idx].group = group_value
+        if self.observers:
+            self._notify("changed", [self.fields[idx] for idx in indexes if 0 <= idx < len(self.fields)], "group")
 
     def update_default_data(self, indexes: list[int], default_value):
+        if self.journal is not None:
+            self.journal.record("update_default_data", indexes, default_value)
         for idx in indexes:
             if 0 <= idx < len(self.fields):
                 self.fields[idx].default_data = default_value
+        if self.observers:
+            self._notify("changed", [self.fields[idx] for idx in indexes if 0 <= idx < len(self.fields)],
+                         "default_data")
 
     def assign_group(self, indices, group):
+        if self.journal is not None:
+            self.journal.record("assign_group", indices, group)
         for i in indices:
             self.fields[i].group = group
+        if self.observers:
+            self._notify("changed", [self.fields[i] for i in indices], "group")
 
+    @timed("FormDocument.move_field")
     def move_field(self, from_index, to_index):
+        if self.journal is not None:
+            self.journal.record("move_field", from_index, to_index)
         field = self.fields.pop(from_index)
         self.fields.insert(to_index, field)
-        self._refresh()
+        low, high = sorted((from_index, to_index))
+        self._renumber(low, high + 1)
 
+    @timed("FormDocument.load_from_dataframe")
     def load_from_dataframe(self, df):
-        self.fields.clear()
+        # Whole columns are normalized at once, then the fields are built in a single pass
+        import pandas as pd
+
+        rows = len(df.index)
+
+        def text(*names):
+            for name in names:
+                if name in df.columns:
+                    return [value if isinstance(value, str) else "" for value in df[name].tolist()]
+            return [""] * rows
+
+        def numbers(name):
+            if name not in df.columns:
+                return [None] * rows
+            column = pd.to_numeric(df[name], errors="coerce")
+            return [None if value != value else int(value) for value in column.tolist()]
+
+        if "OBBLIGO" in df.columns:
+            mandatory = pd.to_numeric(df["OBBLIGO"], errors="coerce").fillna(0).astype(bool).tolist()
+        else:
+            mandatory = [False] * rows
+        if "MODULO_HYPERSIC" in df.columns:
+            modules = [None if value != value else value for value in df["MODULO_HYPERSIC"].tolist()]
+        else:
+            modules = [None] * rows
+
+        self.load_fields(
+            [FormField(code=code, data_type=data_type, description=description, mandatory=flag, group=group,
+                       default_data=default_data, classification=classification, annotation=annotation,
+                       hypersic_module=module, linked_field=linked_field)
+             for code, data_type, description, flag, group, default_data, classification, annotation, module,
+             linked_field in zip(text("CODICE"), text("TIPOLOGIA"), text("DESCRIZIONE"), mandatory,
+                                 text("CATEGORIA"), text("DATI"), numbers("CLASSIFICAZIONE"),
+                                 text("ANNOTAZIONI"), modules, text("CAMPO_COLLEGATO", "LINKED_FIELD"))]
+        )
+
+    @timed("FormDocument.load_fields")
+    def load_fields(self, fields):
+        self.fields = list(fields)
         self.classification = None
-        for _, row in df.iterrows():
-            field = FormField(
-                classification=row.get("CLASSIFICAZIONE", ""),
-                code=row.get("CODICE", ""),
-                data_type=row.get("TIPOLOGIA", ""),
-                description=row.get("DESCRIZIONE", ""),
-                mandatory=row.get("OBBLIGO", ""),
-                group=row.get("CATEGORIA", ""),
-                default_data=row.get("DATI", ""),
-                annotation=row.get("ANNOTAZIONI", ""),
-                hypersic_module=row.get("MODULO_HYPERSIC", ""),
-                linked_field=row.get("LINKED_FIELD", "")
-            )
+        for field in self.fields:
             if isinstance(field.classification, int) and field.classification > 0:
                 self.classification = field.classification
-            self.add_field(field)
         self._refresh()
+        if self.observers:
+            self._notify("reset")
+        if self.journal is not None:
+            self.journal.attach(self)
 
     def __len__(self):
         return len(self.fields)
 
+    @timed("FormDocument._refresh")
     def _refresh(self):
+        # Full O(n) pass: renumber, propagate classification, make codes unique and rebuild the
+        # payload store from the live fields only.
+        # The first occurrence of a code keeps it, later ones get "*" appended until free.
+        self._codes = {}
+        self._suffixes = {}
+        self._payloads = {}
+        self._payload_uses = {}
+        renamed = []
         for n, field in enumerate(self.fields):
             field.order = n * 100
             field.classification = self.classification
-            codes = [field.code for field in self.fields]
-            while field.code in codes[0:n]:
-                field.code += "*"
+            self._share(field)
+            if field.code in self._codes:
+                field.code = self._free_code(field.code)
+                renamed.append(field)
+            self._codes[field.code] = field
+        if renamed and self.observers:
+            self._notify("changed", renamed, "code")
 
+    def _notify(self, event, fields=(), attr=None):
+        for observer in list(self.observers):
+            observer(event, fields, attr)
+
+    def _share(self, field):
+        # Identical payloads end up as one string object; the text itself is untouched, so what is
+        # saved is exactly what was loaded
+        field.description = self._take_payload(field.description)
+        field.annotation = self._take_payload(field.annotation)
+
+    def _unshare(self, field):
+        # A field leaving the document (an undo step may still hold it, and share it again on reinsert)
+        self._drop_payload(field.description)
+        self._drop_payload(field.annotation)
+
+    def _take_payload(self, value):
+        shared = self._payloads.setdefault(value, value)
+        self._payload_uses[value] = self._payload_uses.get(value, 0) + 1
+        return shared
+
+    def _drop_payload(self, value):
+        # Payloads live as long as a field in the document uses them, not for the edit history
+        uses = self._payload_uses.get(value, 0) - 1
+        if uses > 0:
+            self._payload_uses[value] = uses
+        else:
+            self._payload_uses.pop(value, None)
+            self._payloads.pop(value, None)
+
+    def shared_payloads(self):
+        return len(self._payloads)
+
+    def _renumber(self, start=0, stop=None):
+        fields = self.fields
+        for n in range(start, len(fields) if stop is None else min(stop, len(fields))):
+            fields[n].order = n * 100
+
+    def _free_code(self, code):
+        stars = self._suffixes.get(code, 1)
+        while code + "*" * stars in self._codes:
+            stars += 1
+        self._suffixes[code] = stars + 1
+        return code + "*" * stars
+
+    def _claim_code(self, field):
+        # Orders are kept current, so they tell which of two fields comes first.
+        # Returns (owner, old code) when an existing later field had to be renamed.
+        owner = self._codes.get(field.code)
+        displaced = None
+        if owner is not None and owner is not field:
+            if owner.order < field.order:
+                field.code = self._free_code(field.code)
+            else:
+                self._codes[field.code] = field
+                displaced = (owner, owner.code)
+                owner.code = self._free_code(owner.code)
+                # registered before observers hear of the rename, so lookups of the new code succeed
+                self._codes[owner.code] = owner
+                if self.observers:
+                    self._notify("changed", [owner], "code")
+                return displaced
+        self._codes[field.code] = field
+        return displaced
+
+    def _release_code(self, field):
+        code = field.code
+        if self._codes.get(code) is field:
+            del self._codes[code]
+            stars = len(code) - len(code.rstrip("*"))
+            for n in range(1, stars + 1):
+                base = code[:-n]
+                if self._suffixes.get(base, 1) > n:
+                    self._suffixes[base] = n
+
+    @timed("FormDocument.export_to_dataframe")
     def export_to_dataframe(self):
         self._refresh()
         return [field.to_dict() for field in self.fields]
+
+    def export_rows(self):
+        self._refresh()
+        return (field.to_row() for field in self.fields)
+
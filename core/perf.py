@@ -0,0 +1,122 @@
+# core/perf.py
+# Opt-in timers and counters. Switched on by HYPERSIC_PROFILE=1 (or main.py --profile) before the
+# instrumented modules are imported; when off, @timed returns the function untouched.
+#   HYPERSIC_PROFILE_LOG=path   write the summary there at exit (default: stderr)
+#   HYPERSIC_PROFILE_DUMP=path  also run cProfile and dump its stats there at exit
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+
+ENABLED = bool(os.environ.get("HYPERSIC_PROFILE") or os.environ.get("HYPERSIC_PROFILE_DUMP"))
+LOG_PATH = os.environ.get("HYPERSIC_PROFILE_LOG")
+DUMP_PATH = os.environ.get("HYPERSIC_PROFILE_DUMP")
+
+_timers = {}  # name -> [calls, total seconds, slowest call]
+_counters = {}  # name -> count
+_lock = threading.Lock()
+_profiler = None
+_registered = False
+
+
+def enable(log_path=None, dump_path=None):
+    # For command line flags; must run before core.model, core.excel_io or ui.* are imported
+    global ENABLED, LOG_PATH, DUMP_PATH
+    ENABLED = True
+    LOG_PATH = log_path or LOG_PATH
+    DUMP_PATH = dump_path or DUMP_PATH
+    _start()
+
+
+def record(name, seconds):
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+
+def count(name, n=1):
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name):
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    # (timers as (name, calls, total, slowest) by total time, counters as (name, count))
+    with _lock:
+        timers = sorted(((name, *timer) for name, timer in _timers.items()), key=lambda row: -row[2])
+        counters = sorted(_counters.items())
+    return timers, counters
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def report():
+    timers, counters = snapshot()
+    lines = [f"{'operazione':<36}{'chiamate':>10}{'totale ms':>12}{'media ms':>12}{'max ms':>12}"]
+    for name, calls, total, slowest in timers:
+        lines.append(f"{name:<36}{calls:>10}{total * 1000:>12.2f}{total * 1000 / calls:>12.3f}"
+                     f"{slowest * 1000:>12.2f}")
+    if counters:
+        lines.append("")
+        lines.extend(f"{name:<36}{value:>10}" for name, value in counters)
+    return "\n".join(lines)
+
+
+def dump_profile(path):
+    if _profiler is not None:
+        _profiler.dump_stats(path)
+
+
+def _at_exit():
+    if _profiler is not None:
+        _profiler.disable()
+        dump_profile(DUMP_PATH)
+    if _timers or _counters:
+        if LOG_PATH:
+            with open(LOG_PATH, "a", encoding="utf-8") as stream:
+                stream.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} pid {os.getpid()}\n{report()}\n")
+        else:
+            print(report(), file=sys.stderr)
+
+
+def _start():
+    global _profiler, _registered
+    if DUMP_PATH and _profiler is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if not _registered:
+        atexit.register(_at_exit)
+        _registered = True
+
+
+if ENABLED:
+    _start()
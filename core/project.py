@@ -0,0 +1,139 @@
+# core/project.py
+# Compact JSON form of a FormDocument: the native project format and the workbook cache.
+import hashlib
+import json
+import os
+
+from core.model import FormDocument, FormField, COLUMNS
+
+FORMAT = "hypersic-form"
+VERSION = 1
+PROJECT_EXTENSION = ".hsf"
+
+# Set HYPERSIC_CACHE_DIR to move the workbook cache, HYPERSIC_NO_CACHE=1 to turn it off
+CACHE_DIR = os.environ.get("HYPERSIC_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "hypersic")
+CACHE_ENABLED = not os.environ.get("HYPERSIC_NO_CACHE")
+# Past either limit the least recently used entries are deleted
+CACHE_MAX_FILES = 200
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def document_to_dict(document: FormDocument, source=None):
+    # Rows are kept as lists in COLUMNS order, the same values save_excel_file writes
+    data = {"format": FORMAT, "version": VERSION, "columns": COLUMNS,
+            "rows": [list(row) for row in document.export_rows()]}
+    if source is not None:
+        data["source"] = source
+    return data
+
+
+def document_from_dict(data) -> FormDocument:
+    if data.get("format") != FORMAT or data.get("version") != VERSION or data.get("columns") != COLUMNS:
+        raise ValueError("formato non riconosciuto")
+    document = FormDocument()
+    document.load_fields(FormField.from_row(row) for row in data["rows"])
+    return document
+
+
+def _write_json(path, data, durable=False):
+    # Written next to the target and renamed over it, so a reader never sees half a file.
+    # durable=True also gets the content and the rename to disk before returning, for files that
+    # must survive a power loss (the autosave snapshot)
+    directory, name = os.path.split(os.path.abspath(path))
+    temp = os.path.join(directory, f".~{name}.{os.getpid()}.tmp")
+    try:
+        with open(temp, "w", encoding="utf-8") as stream:
+            json.dump(data, stream, ensure_ascii=False, separators=(",", ":"))
+            if durable:
+                stream.flush()
+                os.fsync(stream.fileno())
+        os.replace(temp, path)
+        if durable:
+            _fsync_directory(directory)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def _fsync_directory(directory):
+    # A rename is only on disk once its directory is; Windows has no directory handles to sync
+    if os.name == "nt":
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def save_project(path: str, document: FormDocument):
+    try:
+        _write_json(path, document_to_dict(document))
+    except Exception as e:
+        raise RuntimeError(f"Error writing project file: {e}")
+
+
+def load_project(path: str) -> FormDocument:
+    try:
+        with open(path, encoding="utf-8") as stream:
+            return document_from_dict(json.load(stream))
+    except Exception as e:
+        raise RuntimeError(f"Error reading project file: {e}")
+
+
+def _source_key(path):
+    # What a cache entry is valid for: the workbook's location, mtime and size
+    stat = os.stat(path)
+    return {"path": os.path.normcase(os.path.abspath(path)), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def cache_path(path: str):
+    key = os.path.normcase(os.path.abspath(path))
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def load_cached(path: str):
+    # The cached document for the workbook at `path`, or None when missing or stale
+    if not CACHE_ENABLED:
+        return None
+    try:
+        with open(cache_path(path), encoding="utf-8") as stream:
+            data = json.load(stream)
+        if data.get("source") != _source_key(path):
+            return None
+        os.utime(cache_path(path))  # a hit counts as a use for eviction
+        return document_from_dict(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def store_cached(path: str, document: FormDocument):
+    # Best effort: a cache that can't be written only means the next open parses again
+    if not CACHE_ENABLED:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_json(cache_path(path), document_to_dict(document, source=_source_key(path)))
+        evict_cache()
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def evict_cache(max_files=CACHE_MAX_FILES, max_bytes=CACHE_MAX_BYTES):
+    # Deletes cache entries, oldest use first, until both limits hold
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.is_file() and entry.name.endswith(".json"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for n, (_, size, path) in enumerate(entries):
+        if len(entries) - n <= max_files and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
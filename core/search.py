@@ -0,0 +1,180 @@
+# core/search.py
+# Word index over a FormDocument's code, description (plain text for AN), group and type,
+# kept current through the document's observers.
+import re
+from bisect import bisect_left, insort
+
+from core.html_text import plain_text
+from core.model import FormDocument, FIELD_TYPES
+
+SEARCH_ATTRIBUTES = ("code", "description", "group", "data_type")
+TYPE_LABELS = {code: label for label, code in FIELD_TYPES.items()}
+
+_WORDS = re.compile(r"\w+")  # whole words, FIGLIO_COGNOME included
+_PARTS = re.compile(r"[^\W_]+")  # and their pieces: FIGLIO, COGNOME
+_TAG = re.compile(r"(<[^>]*>)")
+
+
+def field_text(field, attr):
+    # What a field is searched by for `attr`
+    if attr == "description":
+        return plain_text(field.description) if field.data_type == "AN" else field.description
+    if attr == "data_type":
+        return f"{field.data_type} {TYPE_LABELS.get(field.data_type, '')}"
+    value = getattr(field, attr)
+    return value if isinstance(value, str) else ""
+
+
+def _tokens(text):
+    text = text.lower()
+    return frozenset(_WORDS.findall(text)) | frozenset(_PARTS.findall(text))
+
+
+def _prefix_pattern(query):
+    # What a plain query matched: each query word at the start of a word or of a word's piece
+    # (see _tokens), i.e. not right after a letter or digit. Longest words first, so "nome" wins
+    # over "nom" in "nom nome".
+    words = sorted(set(_WORDS.findall(query.lower())), key=len, reverse=True)
+    return re.compile(r"(?<![^\W_])(?:" + "|".join(map(re.escape, words)) + ")", re.IGNORECASE)
+
+
+class SearchIndex:
+    # Plain queries match fields where every query word is the start of a word in the searched
+    # attributes: a couple of bisects on sorted word lists, no pass over the fields.
+    # Regex queries scan the cached texts. The index is built on the first query.
+    def __init__(self, document: FormDocument):
+        self.document = document
+        self._postings = {attr: {} for attr in SEARCH_ATTRIBUTES}  # attr -> word -> set of fields
+        self._words = {attr: [] for attr in SEARCH_ATTRIBUTES}  # attr -> sorted words
+        self._stale = set(SEARCH_ATTRIBUTES)  # attrs whose sorted words need a full sort (after a rebuild)
+        self._entries = {}  # field -> {attr: (text, words)}
+        self._built = False
+        document.observers.append(self._on_change)
+
+    def close(self):
+        if self._on_change in self.document.observers:
+            self.document.observers.remove(self._on_change)
+
+    def rebuild(self):
+        for postings in self._postings.values():
+            postings.clear()
+        self._entries.clear()
+        self._stale.update(SEARCH_ATTRIBUTES)
+        for field in self.document.fields:
+            self._add(field)
+        self._built = True
+
+    def search(self, query, attrs=SEARCH_ATTRIBUTES, regex=False):
+        # The set of matching FormFields, or None when the query is empty (everything matches).
+        # An invalid regex raises re.error.
+        if not query.strip():
+            return None
+        if not self._built:
+            self.rebuild()
+        if regex:
+            pattern = re.compile(query, re.IGNORECASE)
+            return {field for field, entry in self._entries.items()
+                    if any(pattern.search(entry[attr][0]) for attr in attrs)}
+        matches = None
+        for word in _WORDS.findall(query.lower()):
+            found = set()
+            for attr in attrs:
+                found.update(self._prefixed(attr, word))
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return matches if matches is not None else set()
+
+    def rows(self, fields):
+        # Current positions of the given fields, in document order
+        return sorted(field.order // 100 for field in fields)
+
+    def replace_plan(self, query, replacement, attrs=SEARCH_ATTRIBUTES, regex=False):
+        # (row, attr, new value) for every change a find-and-replace over the matching fields would
+        # make. A plain query replaces the word starts it matched, nothing inside other words.
+        # AN descriptions are only rewritten between tags, never inside the markup.
+        matches = self.search(query, attrs, regex)
+        if not matches:
+            return []
+        if regex:
+            pattern = re.compile(query, re.IGNORECASE)
+        else:
+            pattern = _prefix_pattern(query)
+            replacement = replacement.replace("\\", "\\\\")
+        plan = []
+        for row in self.rows(matches):
+            field = self.document.fields[row]
+            for attr in attrs:
+                if attr == "data_type":
+                    continue
+                value = getattr(field, attr)
+                if not isinstance(value, str):
+                    continue
+                if attr == "description" and field.data_type == "AN":
+                    new_value = "".join(part if part.startswith("<") else pattern.sub(replacement, part)
+                                        for part in _TAG.split(value))
+                else:
+                    new_value = pattern.sub(replacement, value)
+                if new_value != value:
+                    plan.append((row, attr, new_value))
+        return plan
+
+    def _prefixed(self, attr, word):
+        words = self._sorted_words(attr)
+        postings = self._postings[attr]
+        found = set()
+        for n in range(bisect_left(words, word), len(words)):
+            if not words[n].startswith(word):
+                break
+            found.update(postings[words[n]])
+        return found
+
+    def _sorted_words(self, attr):
+        if attr in self._stale:
+            self._words[attr] = sorted(self._postings[attr])
+            self._stale.discard(attr)
+        return self._words[attr]
+
+    def _add(self, field):
+        entry = {}
+        for attr in SEARCH_ATTRIBUTES:
+            text = field_text(field, attr)
+            words = _tokens(text)
+            entry[attr] = (text, words)
+            postings = self._postings[attr]
+            for word in words:
+                holders = postings.get(word)
+                if holders is None:
+                    postings[word] = holders = set()
+                    if attr not in self._stale:
+                        insort(self._words[attr], word)
+                holders.add(field)
+        self._entries[field] = entry
+
+    def _remove(self, field):
+        entry = self._entries.pop(field, None)
+        if entry is None:
+            return
+        for attr, (_, words) in entry.items():
+            postings = self._postings[attr]
+            for word in words:
+                holders = postings[word]
+                holders.discard(field)
+                if not holders:
+                    del postings[word]
+                    if attr not in self._stale:
+                        sorted_words = self._words[attr]
+                        del sorted_words[bisect_left(sorted_words, word)]
+
+    def _on_change(self, event, fields, attr):
+        if not self._built:
+            return
+        if event == "reset":
+            self.rebuild()
+        elif event == "removed":
+            for field in fields:
+                self._remove(field)
+        elif event == "added" or attr in SEARCH_ATTRIBUTES:
+            for field in fields:
+                self._remove(field)
+                self._add(field)
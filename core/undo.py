@@ -0,0 +1,313 @@
+# core/undo.py
+import sys
+import time
+from collections import deque
+
+from core.perf import timed, count
+
+# Consecutive edits of the same cell closer than this are undone as one step
+COALESCE_SECONDS = 1.5
+
+TEXT_ATTRIBUTES = ("code", "data_type", "description", "group", "default_data", "annotation", "linked_field")
+
+
+def fields_size(fields):
+    # Strings shared between fields (see FormDocument's payload store) are counted once
+    values = {id(value): value for field in fields for value in (getattr(field, attr) for attr in TEXT_ATTRIBUTES)}
+    return sum(sys.getsizeof(field) for field in fields) + sum(sys.getsizeof(value) for value in values.values())
+
+
+def _row_of(field):
+    # FormDocument keeps every field's order equal to its position * 100
+    return field.order // 100
+
+
+class Command:
+    # A reversible change. redo/undo receive the target the change is applied through: a
+    # FormDocument, or the window's FormTableModel (same batch API) so the views get notified too.
+    label = ""
+
+    def redo(self, target):
+        raise NotImplementedError
+
+    def undo(self, target):
+        raise NotImplementedError
+
+    def size(self):
+        return sys.getsizeof(self)
+
+    def merge(self, other):
+        return False
+
+    def changed(self):
+        # False after a redo that turned out to change nothing: no undo step is recorded
+        return True
+
+
+class InsertFields(Command):
+    label = "Inserisci"
+
+    def __init__(self, position, fields):
+        self.position = position
+        self.fields = list(fields)
+        self.codes = [field.code for field in self.fields]  # as given, before any "*" rename
+        self._displaced = []
+
+    def redo(self, target):
+        # A redo starts from the original codes again, or every undo/redo could add another "*"
+        for field, code in zip(self.fields, self.codes):
+            field.code = code
+        self._displaced = target.insert_many(self.position, self.fields)
+
+    def undo(self, target):
+        target.delete_many([_row_of(field) for field in self.fields])
+        for field, code in reversed(self._displaced):
+            target.set_value(_row_of(field), "code", code)
+
+    def size(self):
+        return super().size() + fields_size(self.fields)
+
+
+class RemoveFields(Command):
+    label = "Elimina"
+
+    def __init__(self, rows):
+        self.rows = sorted(set(rows))
+        self.fields = []
+
+    def redo(self, target):
+        self.fields = target.delete_many(self.rows)
+
+    def undo(self, target):
+        # Put back as one block, then spread it over the original rows if they were scattered
+        if self.rows:
+            target.insert_many(self.rows[0], self.fields)
+            if self.rows[-1] - self.rows[0] + 1 != len(self.rows):
+                target.restore_block(self.rows[0], self.rows)
+
+    def size(self):
+        return super().size() + sys.getsizeof(self.rows) + fields_size(self.fields)
+
+
+class MoveFields(Command):
+    label = "Sposta"
+
+    def __init__(self, rows, destination):
+        self.rows = sorted(set(rows))
+        self.destination = destination
+        self.start = None  # where the block starts once moved
+
+    def redo(self, target):
+        self.start = target.move_block(self.rows, self.destination)
+
+    def changed(self):
+        # A contiguous block dropped onto itself stays where it was
+        return self.rows != list(range(self.start, self.start + len(self.rows)))
+
+    def undo(self, target):
+        target.restore_block(self.start, self.rows)
+
+    def size(self):
+        return super().size() + sys.getsizeof(self.rows)
+
+
+class ShiftFields(Command):
+    # Ctrl+Up / Ctrl+Down on a selection
+    label = "Sposta"
+
+    def __init__(self, rows, direction):
+        self.rows = sorted(set(rows))
+        self.direction = direction
+        self.moved = False
+
+    def redo(self, target):
+        # Nothing moves when a row would leave the table
+        self.moved = target.shift_rows(self.rows, self.direction)
+
+    def changed(self):
+        return self.moved
+
+    def undo(self, target):
+        target.shift_rows([row + self.direction for row in self.rows], -self.direction)
+
+    def size(self):
+        return super().size() + sys.getsizeof(self.rows)
+
+
+class SwapFields(Command):
+    label = "Scambia"
+
+    def __init__(self, row_1, row_2):
+        self.row_1 = row_1
+        self.row_2 = row_2
+
+    def redo(self, target):
+        target.swap_field(self.row_1, self.row_2)
+
+    def undo(self, target):
+        target.swap_field(self.row_1, self.row_2)
+
+
+class SetValue(Command):
+    label = "Modifica"
+
+    def __init__(self, row, attr, value):
+        self.row = row
+        self.attr = attr
+        self.value = value
+        self.old_value = None
+        self.time = time.monotonic()
+        self._displaced = None
+
+    def redo(self, target):
+        self.old_value = getattr(target.fields[self.row], self.attr)
+        self._displaced = target.set_value(self.row, self.attr, self.value)
+
+    def undo(self, target):
+        target.set_value(self.row, self.attr, self.old_value)
+        if self._displaced is not None:
+            field, code = self._displaced
+            target.set_value(_row_of(field), "code", code)
+
+    def merge(self, other):
+        # Typing into the same cell again: keep our old value, take the newer one
+        if (not isinstance(other, SetValue) or other.row != self.row or other.attr != self.attr
+                or self.attr == "code" or other.time - self.time > COALESCE_SECONDS):
+            return False
+        self.value = other.value
+        self.time = other.time
+        return True
+
+    def size(self):
+        return super().size() + sys.getsizeof(self.value) + sys.getsizeof(self.old_value)
+
+
+class SetValues(Command):
+    # One attribute set to the same value on many rows (group assignment, paste of default data...),
+    # or to a value per row (see per_row)
+    label = "Modifica righe"
+
+    def __init__(self, rows, attr, value):
+        self.rows = sorted(set(rows))
+        self.attr = attr
+        self.value = value
+        self.values = None  # aligned with rows, replaces value when set
+        self.old_values = []
+        self._displaced = []
+
+    @classmethod
+    def per_row(cls, values, attr):
+        # values: {row: new value}
+        command = cls(values, attr, None)
+        command.values = [values[row] for row in command.rows]
+        return command
+
+    def redo(self, target):
+        fields = target.fields
+        self.old_values = [getattr(fields[row], self.attr) for row in self.rows]
+        values = self.values if self.values is not None else [self.value] * len(self.rows)
+        self._displaced = target.set_values(self.rows, self.attr, values)
+
+    def undo(self, target):
+        target.set_values(self.rows, self.attr, self.old_values)
+        for field, code in reversed(self._displaced):
+            target.set_value(_row_of(field), "code", code)
+
+    def size(self):
+        values = self.old_values + (self.values or [])
+        return (super().size() + sys.getsizeof(self.rows) + 2 * sys.getsizeof(self.old_values)
+                + sum(sys.getsizeof(value) for value in {id(value): value for value in values}.values()))
+
+
+class CommandGroup(Command):
+    def __init__(self, commands, label=""):
+        self.commands = list(commands)
+        self.label = label
+
+    def redo(self, target):
+        for command in self.commands:
+            command.redo(target)
+
+    def undo(self, target):
+        for command in reversed(self.commands):
+            command.undo(target)
+
+    def changed(self):
+        return any(command.changed() for command in self.commands)
+
+    def size(self):
+        return super().size() + sum(command.size() for command in self.commands)
+
+
+class UndoStack:
+    def __init__(self, max_steps=500, max_bytes=32 * 1024 * 1024):
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        self.listener = None  # called after every push/undo/redo
+        self._undo = deque()
+        self._redo = []
+        self._bytes = 0
+
+    @timed("UndoStack.push")
+    def push(self, command: Command, target):
+        command.redo(target)
+        if not command.changed():
+            return
+        self._redo.clear()
+        if self._undo and self._undo[-1].merge(command):
+            top = self._undo.pop()
+            self._bytes -= top.entry_size
+            command = top
+        command.entry_size = command.size()
+        count("UndoStack.bytes_recorded", command.entry_size)
+        self._undo.append(command)
+        self._bytes += command.entry_size
+        while self._undo and (len(self._undo) > self.max_steps or self._bytes > self.max_bytes):
+            self._bytes -= self._undo.popleft().entry_size
+        self._notify()
+
+    @timed("UndoStack.undo")
+    def undo(self, target):
+        if not self._undo:
+            return
+        command = self._undo.pop()
+        self._bytes -= command.entry_size
+        command.undo(target)
+        self._redo.append(command)
+        self._notify()
+
+    @timed("UndoStack.redo")
+    def redo(self, target):
+        if not self._redo:
+            return
+        command = self._redo.pop()
+        command.redo(target)
+        command.entry_size = command.size()
+        self._undo.append(command)
+        self._bytes += command.entry_size
+        self._notify()
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+        self._notify()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def entry_sizes(self):
+        return [(command.label, command.entry_size) for command in self._undo]
+
+    def size(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._undo)
+
+    def _notify(self):
+        if self.listener is not None:
+            self.listener()
@@ -0,0 +1,169 @@
+# core/validation.py
+# Code and linked-field integrity checks over a FormDocument. A full pass is linear; after that
+# the document's observers trigger re-checks of the affected fields only.
+#   python -m core.validation file.xlsx [...]
+import sys
+
+from core.model import FormDocument
+
+EMPTY_CODE = "empty_code"
+DUPLICATE_CODE = "duplicate_code"
+FL_NOT_CS = "fl_not_cs"
+BROKEN_LINK = "broken_link"
+
+
+def _base(code):
+    # FormDocument makes duplicate codes unique by appending "*"
+    return code.rstrip("*") if code.endswith("*") else None
+
+
+class Validator:
+    def __init__(self, document: FormDocument):
+        self.document = document
+        self.listener = None  # called with the fields whose issues changed
+        self._issues = {}  # field -> [(kind, message)], only fields with issues
+        self._code_of = {}  # field -> code it was last checked with
+        self._link_of = {}  # field -> linked code it was last checked with
+        self._linkers = {}  # code -> fields linking to it
+        self._starred = {}  # base code -> fields renamed from it
+        self.validate_all()
+        document.observers.append(self._on_change)
+
+    def close(self):
+        if self._on_change in self.document.observers:
+            self.document.observers.remove(self._on_change)
+
+    def validate_all(self):
+        self._issues.clear()
+        self._code_of.clear()
+        self._link_of.clear()
+        self._linkers.clear()
+        self._starred.clear()
+        for field in self.document.fields:
+            self._track(field)
+        for field in self.document.fields:
+            self._check(field)
+
+    def issues(self):
+        # (row, code, kind, message) in document order
+        return sorted((field.order // 100, field.code, kind, message)
+                      for field, found in self._issues.items() for kind, message in found)
+
+    def issues_for(self, field):
+        return self._issues.get(field, [])
+
+    def __len__(self):
+        return sum(len(found) for found in self._issues.values())
+
+    def _check(self, field):
+        # Returns True when the field's issues changed
+        found = []
+        code = field.code
+        if not code.strip():
+            found.append((EMPTY_CODE, "Codice vuoto"))
+        base = _base(code)
+        if base is not None and self.document.field_by_code(base) is not None:
+            found.append((DUPLICATE_CODE, f"Codice duplicato di {base}, rinominato in {code}"))
+        if code.startswith("FL") and field.data_type != "CS":
+            found.append((FL_NOT_CS, f"I codici FL devono essere di tipo CS, non {field.data_type}"))
+        link = self._link_of.get(field)
+        if link and self.document.field_by_code(link) is None:
+            found.append((BROKEN_LINK, f"Il campo collegato {link} non esiste"))
+        if found:
+            changed = self._issues.get(field) != found
+            self._issues[field] = found
+            return changed
+        return self._issues.pop(field, None) is not None
+
+    def _track(self, field):
+        code = field.code
+        self._code_of[field] = code
+        base = _base(code)
+        if base is not None:
+            self._starred.setdefault(base, set()).add(field)
+        link = field.linked_field.strip() if isinstance(field.linked_field, str) else ""
+        self._link_of[field] = link
+        if link:
+            self._linkers.setdefault(link, set()).add(field)
+
+    def _untrack(self, field):
+        code = self._code_of.pop(field, None)
+        if code is None:
+            return None
+        base = _base(code)
+        if base is not None:
+            self._discard(self._starred, base, field)
+        link = self._link_of.pop(field, "")
+        if link:
+            self._discard(self._linkers, link, field)
+        return code
+
+    @staticmethod
+    def _discard(index, key, field):
+        fields = index.get(key)
+        if fields is not None:
+            fields.discard(field)
+            if not fields:
+                del index[key]
+
+    def _dependents(self, codes):
+        # Fields whose verdict depends on whether these codes exist
+        fields = set()
+        for code in codes:
+            fields.update(self._linkers.get(code, ()))
+            fields.update(self._starred.get(code, ()))
+        return fields
+
+    def _on_change(self, event, fields, attr):
+        if event == "reset":
+            self.validate_all()
+            if self.listener is not None:
+                self.listener(list(self.document.fields))
+            return
+        if event != "added" and event != "removed" and attr not in ("code", "data_type", "linked_field"):
+            return
+        codes = set()
+        recheck = set()
+        changed = set()
+        for field in fields:
+            old_code = self._untrack(field)
+            if old_code is not None:
+                codes.add(old_code)
+            if event == "removed":
+                if self._issues.pop(field, None) is not None:
+                    changed.add(field)
+            else:
+                self._track(field)
+                codes.add(field.code)
+                recheck.add(field)
+        recheck.update(self._dependents(codes))
+        changed.update(field for field in recheck if self._check(field))
+        if changed and self.listener is not None:
+            self.listener(list(changed))
+
+
+def validate_document(document: FormDocument):
+    # One-off check for headless use: [(row, code, kind, message)]
+    validator = Validator(document)
+    validator.close()
+    return validator.issues()
+
+
+def main(argv=None):
+    from core.excel_io import load_excel_file
+
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("uso: python -m core.validation file.xlsx [...]", file=sys.stderr)
+        return 2
+    total = 0
+    for path in paths:
+        issues = validate_document(load_excel_file(path))
+        total += len(issues)
+        for row, code, _, message in issues:
+            print(f"{path}:{row + 1}: {code}: {message}")
+    return 1 if total else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,53 @@
 import sys
-from PyQt6.QtWidgets import QApplication
-from ui.main_window import MainWindow
+import time
+
+STARTED = time.perf_counter()
+
+# Modules that should only be loaded once a feature needs them
+LAZY_MODULES = ("pandas", "openpyxl", "ui.r_html_editor", "PySide6")
+
+
+def _option(name):
+    # Value following `name` on the command line, or None
+    if name in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(name) + 1]
+    return None
 
 
 def main():
+    args = sys.argv[1:]
+    if "--profile" in sys.argv or "--profile-log" in sys.argv or "--profile-dump" in sys.argv:
+        # Before anything instrumented is imported, or its timers stay off
+        from core import perf
+        log_path, dump_path = _option("--profile-log"), _option("--profile-dump")
+        perf.enable(log_path=log_path, dump_path=dump_path)
+        args = [arg for arg in args if arg not in ("--profile", "--profile-log", "--profile-dump", log_path, dump_path)]
+
+    if "--batch" in args:
+        # Headless mode: Qt is never imported
+        from core.batch import main as batch_main
+        sys.exit(batch_main([arg for arg in args if arg != "--batch"]))
+
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+    from ui.main_window import MainWindow
+
     app = QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(legacy_table="--legacy-table" in sys.argv)
     window.show()
+    if "--startup-time" in args:
+        # Measurement mode: report once the first event loop pass has drawn the window, then quit
+        QTimer.singleShot(0, lambda: (report_startup(), app.quit()))
+    else:
+        QTimer.singleShot(0, window.offer_recovery)
     sys.exit(app.exec())
 
 
+def report_startup():
+    loaded = [name for name in LAZY_MODULES if name in sys.modules]
+    print(f"avvio: {(time.perf_counter() - STARTED) * 1000:.0f} ms, moduli caricati in anticipo: "
+          f"{', '.join(loaded) or 'nessuno'}")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,36 @@
+from core.diff import merge_documents, diff_documents, ORDER
+from core.model import FormDocument, FormField
+
+
+def document(*codes):
+    result = FormDocument()
+    result.load_fields(FormField(code=code, data_type="TE", description="", mandatory=False) for code in codes)
+    return result
+
+
+def codes(doc):
+    return [field.code for field in doc.fields]
+
+
+def test_merge_takes_moves_from_either_side():
+    merged, conflicts = merge_documents(document("A", "B", "C", "D"), document("B", "A", "C", "D"),
+                                        document("A", "B", "D", "C"))
+    assert codes(merged) == ["B", "A", "D", "C"]
+    assert conflicts == []
+
+
+def test_merge_reports_conflicting_moves_of_the_same_rows():
+    merged, conflicts = merge_documents(document("A", "B", "C"), document("B", "A", "C"), document("A", "C", "B"))
+    assert [conflict[1] for conflict in conflicts] == [ORDER]
+    assert codes(merged) in (["B", "A", "C"], ["A", "C", "B"])
+
+
+def test_merge_of_the_same_move_is_not_a_conflict():
+    merged, conflicts = merge_documents(document("A", "B", "C"), document("C", "A", "B"), document("C", "A", "B"))
+    assert codes(merged) == ["C", "A", "B"]
+    assert conflicts == []
+
+
+def test_diff_reports_moves():
+    changes = diff_documents(document("A", "B", "C"), document("C", "A", "B"))
+    assert [(kind, code) for kind, code, *_ in changes] == [("moved", "C")]
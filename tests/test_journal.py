@@ -0,0 +1,38 @@
+import random
+
+from core.journal import Journal, recover
+from core.model import FormDocument, FormField
+
+
+def field(code, data_type="TE"):
+    return FormField(code=code, data_type=data_type, description=f"{code} descrizione", mandatory=False)
+
+
+def rows(document):
+    return [field.to_row() for field in document.fields]
+
+
+def test_recovered_document_matches_the_live_one(tmp_path):
+    rnd = random.Random(0)
+    document = FormDocument()
+    document.load_fields([field("A"), field("FL1"), field("B")])
+    journal = Journal(str(tmp_path))
+    journal.attach(document)
+    for n in range(300):
+        if n == 150:
+            journal.attach(document)  # a new snapshot, so recovery reads both it and the journal
+        choice = rnd.randrange(4)
+        if choice == 0:
+            # an FL field of another type, as left by editing the type of an FL row
+            inserted = field(rnd.choice(["FL", "C", "FL2"]))
+            inserted.data_type = rnd.choice(["TE", "AN", "CS"])
+            document.insert_many(rnd.randint(0, len(document)), [inserted])
+        elif choice == 1 and len(document) > 3:
+            document.delete_many([rnd.randrange(len(document))])
+        elif choice == 2:
+            document.set_value(rnd.randrange(len(document)), "data_type", rnd.choice(["TE", "AN", "CS"]))
+        else:
+            document.set_value(rnd.randrange(len(document)), "description", f"testo {n}")
+    journal.flush()
+    assert rows(recover(journal.session, journal.directory)) == rows(document)
+    journal.close()
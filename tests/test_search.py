@@ -0,0 +1,47 @@
+import random
+
+from core.model import FormDocument, FormField
+from core.search import SearchIndex, SEARCH_ATTRIBUTES, _tokens, field_text
+
+
+def field(code, description="", data_type="TE"):
+    return FormField(code=code, data_type=data_type, description=description, mandatory=False)
+
+
+def index(*fields):
+    document = FormDocument()
+    document.load_fields(fields)
+    return SearchIndex(document)
+
+
+def test_replace_touches_only_the_words_the_search_matched():
+    search = index(field("NOME", "Nome e cognome del figlio"), field("COGNOME", "Cognome"))
+    assert [field.code for field in search.search("nome")] == ["NOME"]
+    assert search.replace_plan("nome", "NAME") == [(0, "code", "NAME"), (0, "description", "NAME e cognome del figlio")]
+
+
+def test_replace_with_several_words_replaces_each_of_them():
+    search = index(field("NOME", "Nome e cognome del figlio"), field("FIGLIO_NOME", "Nome"))
+    assert search.replace_plan("nome figlio", "X") == [
+        (0, "code", "X"), (0, "description", "X e cognome del X"), (1, "code", "X_X"), (1, "description", "X")]
+
+
+def test_replace_keeps_an_markup():
+    search = index(field("A", "<p class=nome>Nome</p>", "AN"))
+    assert search.replace_plan("nome", "Cognome") == [(0, "description", "<p class=nome>Cognome</p>")]
+
+
+def test_replace_plan_only_touches_what_search_reported():
+    rnd = random.Random(0)
+    words = ["nome", "cognome", "figlio", "data", "nascita", "nom", "NOMINATIVO", "padre"]
+    fields = [field("_".join(rnd.sample(words, 2)).upper(), " ".join(rnd.sample(words, 3))) for _ in range(60)]
+    search = index(*fields)
+    for query in ["nome", "nom", "figlio nome", "cog", "data nasc", "padre nome"]:
+        matches = search.search(query)
+        plan = search.replace_plan(query, "§")
+        assert {row for row, _, _ in plan} <= set(search.rows(matches))
+        for row, attr, value in plan:
+            # only attributes holding a word that starts with a query word change
+            before = _tokens(field_text(search.document.fields[row], attr))
+            assert any(token.startswith(word) for word in query.split() for token in before)
+            assert "§" in value
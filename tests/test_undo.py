@@ -0,0 +1,19 @@
+from core.model import FormDocument, FormField
+from core.undo import MoveFields, UndoStack
+
+
+def document(codes):
+    result = FormDocument()
+    result.load_fields(FormField(code=code, data_type="TE", description="", mandatory=False) for code in codes)
+    return result
+
+
+def test_moving_a_block_onto_itself_is_no_undo_step():
+    doc, history = document("ABCDE"), UndoStack()
+    for destination in (1, 2, 3):
+        history.push(MoveFields([1, 2], destination), doc)
+    assert not history.can_undo()
+    history.push(MoveFields([1, 2], 4), doc)
+    assert [field.code for field in doc.fields] == list("ADBCE")
+    history.undo(doc)
+    assert [field.code for field in doc.fields] == list("ABCDE")
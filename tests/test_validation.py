@@ -0,0 +1,31 @@
+import random
+
+from core.model import FormDocument, FormField
+from core.validation import Validator, validate_document, BROKEN_LINK
+
+
+def field(code, linked_field=""):
+    return FormField(code=code, data_type="TE", description="", mandatory=False, linked_field=linked_field)
+
+
+def test_insert_renaming_existing_code_keeps_links_valid():
+    document = FormDocument()
+    document.load_fields([field("A"), field("B", linked_field="A*")])
+    validator = Validator(document)
+    document.insert_many(0, [field("A")])
+    assert validator.issues() == validate_document(document)
+    assert not [issue for issue in validator.issues() if issue[2] == BROKEN_LINK]
+
+
+def test_incremental_matches_full_validation_after_renaming_inserts():
+    rnd = random.Random(0)
+    codes = ["A", "A*", "A**", "B", "C"]
+    document = FormDocument()
+    document.load_fields([field(code, linked_field=rnd.choice(codes)) for code in codes])
+    validator = Validator(document)
+    for _ in range(200):
+        fields = [field(rnd.choice(codes), linked_field=rnd.choice(codes + [""])) for _ in range(rnd.randint(1, 3))]
+        document.insert_many(rnd.randint(0, len(document)), fields)
+        if len(document) > 12:
+            document.delete_many(rnd.sample(range(len(document)), 4))
+        assert validator.issues() == validate_document(document)
@@ -0,0 +1,75 @@
+# ui/delegates.py
+from PyQt6.QtCore import Qt, QEvent, QRect, QSize
+from PyQt6.QtWidgets import QStyledItemDelegate, QComboBox, QStyle, QStyleOptionButton, QApplication
+
+from core.model import FIELD_TYPES
+from ui.table_model import TYPE_LABELS
+
+
+class TypeDelegate(QStyledItemDelegate):
+    # The combo box only exists while the cell is being edited
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.addItems(FIELD_TYPES.keys())
+        combo.activated.connect(lambda _, editor=combo: self._commit(editor))
+        return combo
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(TYPE_LABELS.get(index.data(Qt.ItemDataRole.EditRole), ""))
+        editor.showPopup()
+
+    def setModelData(self, editor, model, index):
+        label = editor.currentText()
+        model.setData(index, FIELD_TYPES.get(label, label), Qt.ItemDataRole.EditRole)
+
+    def _commit(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+
+class MandatoryDelegate(QStyledItemDelegate):
+    # Paints a centered check box and toggles it in place, without any editor widget
+    def paint(self, painter, option, index):
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        button = QStyleOptionButton()
+        button.rect = self._check_rect(option)
+        button.state = QStyle.StateFlag.State_Enabled
+        button.state |= QStyle.StateFlag.State_On if index.data(Qt.ItemDataRole.EditRole) else QStyle.StateFlag.State_Off
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.ControlElement.CE_CheckBox, button, painter, option.widget)
+
+    def createEditor(self, parent, option, index):
+        return None
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease:
+            if event.button() != Qt.MouseButton.LeftButton or not self._check_rect(option).contains(
+                    event.position().toPoint()):
+                return False
+        elif event.type() == QEvent.Type.MouseButtonDblClick:
+            return True
+        elif event.type() == QEvent.Type.KeyPress:
+            if event.key() not in (Qt.Key.Key_Space, Qt.Key.Key_Select):
+                return False
+        else:
+            return False
+        return model.setData(index, not index.data(Qt.ItemDataRole.EditRole), Qt.ItemDataRole.EditRole)
+
+    @staticmethod
+    def _check_rect(option):
+        style = option.widget.style() if option.widget else QApplication.style()
+        size = style.pixelMetric(QStyle.PixelMetric.PM_IndicatorWidth)
+        return QRect(option.rect.center().x() - size // 2, option.rect.center().y() - size // 2, size, size)
+
+
+class DescriptionDelegate(QStyledItemDelegate):
+    # Descriptions are drawn on one elided line (the model hands out a plain-text preview for AN
+    # fields), and the size hint never measures the text itself.
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        option.features &= ~option.ViewItemFeature.WrapText
+        option.textElideMode = Qt.TextElideMode.ElideRight
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), option.fontMetrics.height() + 6)
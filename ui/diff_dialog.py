@@ -0,0 +1,78 @@
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QTreeWidget, QTreeWidgetItem, QPushButton, QLabel
+
+from core.diff import KIND_LABELS, ORDER, short_value
+
+HEADERS = ["Modifica", "Codice", "Riga", "Colonna", "Prima", "Dopo"]
+CONFLICT_HEADERS = ["Codice", "Colonna", "Base", "Nostro", "Loro"]
+
+
+class DiffDialog(QDialog):
+    # Lists the result of core.diff: the changes between two documents, or the conflicts of a merge.
+    # Double-clicking a change asks the window to select that row.
+    row_activated = pyqtSignal(int)
+
+    def __init__(self, title, changes=None, conflicts=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setMinimumSize(900, 500)
+
+        self.tree = QTreeWidget()
+        self.tree.setUniformRowHeights(True)
+        if conflicts is None:
+            self._fill_changes(changes)
+            summary = f"{len(changes)} differenze"
+        else:
+            self._fill_conflicts(conflicts)
+            summary = f"{len(conflicts)} conflitti (è stato tenuto il nostro valore)"
+        self.tree.itemDoubleClicked.connect(self._activated)
+
+        close_button = QPushButton("Chiudi")
+        close_button.clicked.connect(self.accept)
+        buttons = QHBoxLayout()
+        buttons.addWidget(QLabel(summary))
+        buttons.addStretch()
+        buttons.addWidget(close_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.tree)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def _fill_changes(self, changes):
+        self.tree.setHeaderLabels(HEADERS)
+        items = []
+        for kind, code, old_row, new_row, columns in changes:
+            if new_row is None:
+                where = f"{old_row + 1}"
+            elif old_row is None or old_row == new_row:
+                where = f"{new_row + 1}"
+            else:
+                where = f"{old_row + 1} → {new_row + 1}"
+            item = QTreeWidgetItem([KIND_LABELS[kind], code, where])
+            item.setData(0, Qt.ItemDataRole.UserRole, new_row)
+            for column, (old, new) in columns.items():
+                item.addChild(QTreeWidgetItem(["", "", "", column, short_value(old), short_value(new)]))
+            items.append(item)
+        self.tree.addTopLevelItems(items)
+        if len(items) <= 200:
+            self.tree.expandAll()
+
+    def _fill_conflicts(self, conflicts):
+        self.tree.setHeaderLabels(CONFLICT_HEADERS)
+        items = []
+        for code, column, base, ours, theirs in conflicts:
+            if column is None:
+                items.append(QTreeWidgetItem([code, "", "", "eliminato" if ours is None else "modificato",
+                                              "eliminato" if theirs is None else "modificato"]))
+            elif column == ORDER:
+                items.append(QTreeWidgetItem([code, column, "", "spostato", "spostato"]))
+            else:
+                items.append(QTreeWidgetItem([code, column, short_value(base), short_value(ours), short_value(theirs)]))
+        self.tree.addTopLevelItems(items)
+
+    def _activated(self, item, _):
+        item = item.parent() or item
+        row = item.data(0, Qt.ItemDataRole.UserRole)
+        if row is not None:
+            self.row_activated.emit(row)
@@ -1,24 +1,56 @@
 # ui/main_window.py
-from PyQt6.QtCore import Qt
+import os
+import re
+import time
+
+from PyQt6.QtCore import Qt, QTimer, QMimeData, QByteArray, pyqtSignal
 from PyQt6.QtGui import QAction
 from PyQt6.QtGui import QKeySequence
 from PyQt6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QFileDialog,
-    QTableWidget, QTableWidgetItem, QMenu, QMessageBox,
-    QComboBox, QCheckBox, QHBoxLayout, QDialog,
-    QTextEdit, QPushButton, QLabel, QAbstractItemView, QInputDialog, QHeaderView
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QFileDialog,
+    QTableWidgetItem, QMenu, QMessageBox,
+    QComboBox, QCheckBox, QHBoxLayout,
+    QAbstractItemView, QInputDialog, QHeaderView, QProgressDialog
 )
 
-from PyQt6.QtGui import QKeyEvent
-
+from core import perf
+from core.clipboard import (
+    MIME_TYPE, fields_to_payload, fields_from_payload, fields_to_tsv, fields_from_tsv, has_header
+)
+from core.diff import diff_documents, merge_documents
 from core.excel_io import load_excel_file, save_excel_file
+from core.html_text import preview
 from core.model import FormDocument, FormField, FIELD_TYPES
-from ui.widgets import DraggableTableWidget
-from ui.r_html_editor import RichTextEditorDialog
+from core.groups import GroupIndex
+from core.journal import AUTOSAVE_ENABLED, Journal, pending_sessions, recover, discard
+from core.perf import timed
+from core.search import SearchIndex
+from core.validation import Validator
+from core.undo import (
+    UndoStack, InsertFields, RemoveFields, MoveFields, ShiftFields, SwapFields, SetValue, SetValues, CommandGroup
+)
+from ui.delegates import TypeDelegate, MandatoryDelegate, DescriptionDelegate
+from ui.diff_dialog import DiffDialog
+from ui.search_bar import SearchBar
+from ui.table_model import (
+    FormTableModel, FormFilterProxy, COLUMNS, CODE_COLUMN, TYPE_COLUMN, DESCRIPTION_COLUMN, MANDATORY_COLUMN
+)
+from ui.widgets import DraggableTableWidget, DraggableTableView
+from ui.workers import IoJob, IoPool
+
+# Set HYPERSIC_DEBUG_DUMP=1 to print the whole document after every table edit
+DEBUG_DUMP = bool(os.environ.get("HYPERSIC_DEBUG_DUMP"))
+
+# Pause before a failed autosave starts over
+JOURNAL_RETRY_SECONDS = 30
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    windows = []  # extra windows opened by a multi-file open, kept alive here
+    # Autosave state from the journal's writer thread: the error, or None once it writes again
+    journal_state = pyqtSignal(object)
+
+    def __init__(self, legacy_table=False):
         super().__init__()
 
         self._copied_group = None
@@ -30,13 +62,28 @@ class MainWindow(QMainWindow):
         self.document = FormDocument()
 
         self._copied_fields: list[FormField] = []
+        self._clipboard_payload = None  # what this window last put on the clipboard
+        self._clipboard_rows = False  # whether the clipboard holds rows, updated when it changes
         self._custom_field_factory = None
 
         self._cut_fields = []
         self._cut_origin_rows = []
 
-        self.undo_stack = []
-        self.redo_stack = []
+        self.history = UndoStack()
+        self.io = IoPool()
+        self._saves = set()  # save jobs started here
+        self._last_save = None
+        # Crash recovery: every change is journaled in the background (HYPERSIC_NO_AUTOSAVE=1 to disable)
+        self.journal = Journal() if AUTOSAVE_ENABLED else None
+        self._journal_warned = False
+        if self.journal is not None:
+            self.journal_state.connect(self._journal_state_changed)
+            self.journal.listener = self.journal_state.emit  # queued back to the GUI thread
+            self.journal.attach(self.document)
+        self.search_index = SearchIndex(self.document)
+        self.group_index = GroupIndex(self.document)
+        self.validator = None
+        self._unvalidated_cells = set()  # fields whose issue highlight must be redrawn
 
         # Menu bar
         menubar = self.menuBar()
@@ -52,6 +99,15 @@ class MainWindow(QMainWindow):
         self.export_action.triggered.connect(self.export_file)
         file_menu.addAction(self.export_action)
 
+        file_menu.addSeparator()
+        self.compare_action = QAction("Confronta con file Excel...", self)
+        self.compare_action.triggered.connect(self.compare_file)
+        file_menu.addAction(self.compare_action)
+
+        self.merge_action = QAction("Unisci con file Excel...", self)
+        self.merge_action.triggered.connect(self.merge_file)
+        file_menu.addAction(self.merge_action)
+
         # Menu bar add
         add_menu = menubar.addMenu("Aggiungi")
 
@@ -89,18 +145,18 @@ class MainWindow(QMainWindow):
 
         self.assign_group_action = QAction("Assegna a gruppo", self)
         self.assign_group_action.triggered.connect(
-            lambda: self.assign_group_dialog(self.table.selectionModel().selectedRows()))
+            lambda: self.assign_group_dialog(self.selected_indexes()))
         edit_menu.addAction(self.assign_group_action)
 
         self.toggle_mandatory_action = QAction("Abilita/disabilita obbligatorietà", self)
         self.toggle_mandatory_action.triggered.connect(
-            lambda: self.toggle_mandatory(self.table.selectionModel().selectedRows()))
+            lambda: self.toggle_mandatory(self.selected_indexes()))
         edit_menu.addAction(self.toggle_mandatory_action)
 
         self.delete_action = QAction("Elimina", self)
         self.delete_action.setShortcut(QKeySequence(Qt.Key.Key_Delete))
         self.delete_action.triggered.connect(
-            lambda: self.delete_rows(self.table.selectionModel().selectedRows()))
+            lambda: self.delete_rows(self.selected_indexes()))
         edit_menu.addAction(self.delete_action)
 
         self.undo_action = QAction("Annulla", self)
@@ -113,27 +169,78 @@ class MainWindow(QMainWindow):
         self.redo_action.triggered.connect(self.redo)
         edit_menu.addAction(self.redo_action)
 
+        self.validate_action = QAction("Verifica codici e collegamenti", self)
+        self.validate_action.triggered.connect(self.show_issues)
+        edit_menu.addAction(self.validate_action)
+
+        self.find_action = QAction("Cerca e sostituisci", self)
+        self.find_action.setShortcut(QKeySequence("Ctrl+F"))
+        self.find_action.triggered.connect(lambda: self.search_bar.focus())
+        edit_menu.addAction(self.find_action)
+
+        # Only there when started with HYPERSIC_PROFILE=1 / --profile
+        if perf.ENABLED:
+            tools_menu = menubar.addMenu("Strumenti")
+            performance_action = QAction("Prestazioni", self)
+            performance_action.triggered.connect(self.show_performance)
+            tools_menu.addAction(performance_action)
+
         # Central widget and layout
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
         layout = QVBoxLayout()
         main_widget.setLayout(layout)
 
-        # Table
-        self.table = DraggableTableWidget(parent=self)
+        self.search_bar = SearchBar(self)
+        self.search_bar.search_changed.connect(self.apply_filter)
+        self.search_bar.replace_requested.connect(self.replace_all)
+        layout.addWidget(self.search_bar)
+
+        # Table: every edit goes through table_model. The default view renders straight from it,
+        # the legacy QTableWidget (one widget per cell) is rebuilt from its notifications.
+        self.legacy_table = legacy_table
+        self.table_model = FormTableModel(self.document, self, undo_stack=self.history)
+        self._attach_validator()
+        if legacy_table:
+            self.table = DraggableTableWidget(parent=self)
+            self.table.setColumnCount(len(COLUMNS))
+            self.table.setHorizontalHeaderLabels([label for label, _ in COLUMNS])
+            self.table.cellChanged.connect(self.sync_table_to_model)
+            self.table.cellDoubleClicked.connect(self.handle_double_click)
+            self.table_model.modelReset.connect(self.fill_table_widget)
+            self.table_model.rowsInserted.connect(lambda *_: self.fill_table_widget())
+            self.table_model.rowsRemoved.connect(lambda *_: self.fill_table_widget())
+            self.table_model.rowsMoved.connect(lambda *_: self.fill_table_widget())
+            self.table_model.layoutChanged.connect(lambda *_: self.fill_table_widget())
+            self.table_model.dataChanged.connect(
+                lambda top_left, bottom_right, *_: self.update_table_widget_rows(top_left.row(), bottom_right.row()))
+        else:
+            # Searches filter through the proxy; the view never sees rows being rebuilt
+            self.filter_model = FormFilterProxy(self)
+            self.filter_model.setSourceModel(self.table_model)
+            self.table = DraggableTableView(parent=self)
+            self.table.setModel(self.filter_model)
+            self.table.setItemDelegateForColumn(TYPE_COLUMN, TypeDelegate(self.table))
+            self.table.setItemDelegateForColumn(MANDATORY_COLUMN, MandatoryDelegate(self.table))
+            self.table.setItemDelegateForColumn(DESCRIPTION_COLUMN, DescriptionDelegate(self.table))
+            self.table.doubleClicked.connect(
+                lambda index: self.handle_double_click(self.table.source_row(index), index.column()))
+
+        # An active search is re-run when the document changes, so edited or new rows are matched
+        self._refilter_paused = False
+        self._refilter_pending = False
+        for signal in (self.table_model.modelReset, self.table_model.rowsInserted, self.table_model.rowsRemoved,
+                       self.table_model.rowsMoved, self.table_model.layoutChanged, self.table_model.dataChanged):
+            signal.connect(self._refilter)
+
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
 
         self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
 
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(
-            ["Codice", "Tipologia", "Descrizione", "Raggruppamento", "Campo obbligatorio", "Dati di default"])
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.open_context_menu)
-        self.table.cellChanged.connect(self.sync_table_to_model)
-        self.table.cellDoubleClicked.connect(self.handle_double_click)
 
         # Enable drag and drop inside the table
         self.table.setDragEnabled(True)
@@ -145,55 +252,62 @@ class MainWindow(QMainWindow):
         # Connect to header press for drag restriction
         self.table.verticalHeader().sectionPressed.connect(self.start_drag_from_header)
         self.table.selectionModel().selectionChanged.connect(self.update_edit_actions)
+        QApplication.clipboard().dataChanged.connect(self._clipboard_changed)
+        self._clipboard_changed()
         self.update_edit_actions()
 
         layout.addWidget(self.table)
 
         self._suppress_signal = False
         self._drag_allowed = False
+        self.history.listener = self.update_edit_actions
+
+    def selected_indexes(self):
+        # One table_model index per selected row, in document order, whatever the view filters
+        return [self.table_model.index(row, 0) for row in self.table.selected_rows()]
 
     def update_edit_actions(self):
-        selection = self.table.selectionModel().selectedRows()
+        selection = self.selected_indexes()
         has_selection = bool(selection)
         self.copy_action.setEnabled(has_selection)
         self.cut_action.setEnabled(has_selection)
-        self.paste_action.setEnabled(has_selection and (bool(self._cut_fields)) or bool(self._copied_fields))
+        self.paste_action.setEnabled(bool(self._cut_fields) or bool(self._copied_fields) or self.clipboard_has_fields())
         self.assign_group_action.setEnabled(has_selection)
         self.toggle_mandatory_action.setEnabled(has_selection)
         self.delete_action.setEnabled(has_selection)
-        self.undo_action.setEnabled(bool(self.undo_stack))
-        self.redo_action.setEnabled(bool(self.redo_stack))
+        self.undo_action.setEnabled(self.history.can_undo())
+        self.redo_action.setEnabled(self.history.can_redo())
+
+    def execute(self, command):
+        self._run(self.history.push, command)
 
     def trigger_copy(self):
-        indexes = self.table.selectionModel().selectedRows()
+        indexes = self.selected_indexes()
         if indexes:
             self.copy_selected_rows(indexes)
             self.update_edit_actions()
 
     def trigger_cut(self):
-        indexes = self.table.selectionModel().selectedRows()
+        indexes = self.selected_indexes()
         if indexes:
             self._copied_fields = []
             self.cut_selected_rows(indexes)
 
     def trigger_paste(self):
-        indexes = self.table.selectionModel().selectedRows()
-        if indexes and (bool(self._cut_fields) or bool(self._copied_fields)):
+        # Right after the first selected row, at the end when nothing is selected
+        indexes = self.selected_indexes()
+        row = indexes[0].row() + 1 if indexes else len(self.document)
+        if bool(self._cut_fields) or bool(self._copied_fields) or self.clipboard_has_fields():
             if bool(self._cut_fields):
-                self.save_snapshot()
-                row = indexes[0].row() + 1
-                for i, field in enumerate(self._cut_fields):
-                    self.insert_existing_field_at(row + i, field.copy())
+                self.execute(InsertFields(row, [field.copy() for field in self._cut_fields]))
                 self._cut_fields = []
                 self._cut_origin_rows = []
             else:
-                row = indexes[0].row() + 1
                 self.paste_fields_at(row)
         self.update_edit_actions()
 
     def insert_existing_field_at(self, row, field: FormField):
-        self.document.add_field(field=field, position=row)
-        self.refresh_table()
+        self.execute(InsertFields(row, [field]))
 
     def copy_group(self, indexes):
         if indexes:
@@ -203,78 +317,364 @@ class MainWindow(QMainWindow):
 
     def paste_group(self, indexes):
         if self._copied_group is not None:
-            self.save_snapshot()
-            rows = [index.row() for index in indexes]
-            self.document.update_group(rows, self._copied_group)
-            self.refresh_table()
+            self.execute(SetValues([index.row() for index in indexes], "group", self._copied_group))
 
     def copy_default_data(self, indexes):
         if indexes:
             first_row = indexes[0].row()
             if 0 <= first_row < len(self.document.fields):
                 self._copied_default_data = self.document.fields[first_row].default_data
-                print(f"[COPY DEFAULT] Default data copiato: {self._copied_default_data}")
 
     def paste_default_data(self, indexes):
-        self.save_snapshot()
         if self._copied_default_data is not None:
-            rows = [index.row() for index in indexes]
-            self.document.update_default_data(rows, self._copied_default_data)
-            self.refresh_table()
+            self.execute(SetValues([index.row() for index in indexes], "default_data", self._copied_default_data))
 
     def delete_rows(self, indexes):
-        self.save_snapshot()
-        rows = sorted([index.row() for index in indexes], reverse=True)
-        for row in rows:
-            self.document.remove_field(row)
-        self.refresh_table()
+        self.execute(RemoveFields([index.row() for index in indexes]))
 
     def copy_selected_rows(self, indexes):
         rows = [i.row() for i in indexes]
         self._copied_fields = [self.document.fields[i].copy() for i in rows]
+        self.put_on_clipboard(self._copied_fields)
 
     def cut_selected_rows(self, indexes):
-        self.save_snapshot()
+        commands = []
         if self._cut_fields and self._cut_origin_rows:
-            for i, field in zip(self._cut_origin_rows, self._cut_fields):
-                self.document.add_field(field.copy(), i)
+            # a pending cut is put back first
+            commands.extend(InsertFields(i, [field.copy()]) for i, field in zip(self._cut_origin_rows, self._cut_fields))
             self._cut_fields = []
             self._cut_origin_rows = []
 
         rows = sorted(set(index.row() for index in indexes))
         self._cut_origin_rows = rows
         self._cut_fields = [self.document.fields[i].copy() for i in rows]
-        self.delete_rows(indexes)
+        self.put_on_clipboard(self._cut_fields)
+        commands.append(RemoveFields(rows))
+        self.execute(CommandGroup(commands, "Taglia"))
 
     def start_drag_from_header(self, index):
         self._drag_allowed = True
 
     def paste_fields_at(self, row: int):
-        self.save_snapshot()
-        for i, field in enumerate(self._copied_fields):
-            self.insert_existing_field_at(row + i, field.copy())
+        # Whatever is on the system clipboard wins: rows copied in another window or instance, or
+        # from a spreadsheet. The whole paste is one insert and one undo step.
+        fields = self.clipboard_fields()
+        if fields is None and not self._clipboard_rows:
+            # no clipboard to read (e.g. no platform clipboard): this window's own copy
+            fields = [field.copy() for field in self._copied_fields]
+        if fields:
+            command = InsertFields(row, fields)
+            command.label = "Incolla"
+            self.execute(command)
+
+    def put_on_clipboard(self, fields):
+        # Typed rows for other editors, TSV with a header row for spreadsheets
+        self._clipboard_payload = fields_to_payload(fields)
+        mime = QMimeData()
+        mime.setData(MIME_TYPE, QByteArray(self._clipboard_payload))
+        mime.setText(fields_to_tsv(fields))
+        QApplication.clipboard().setMimeData(mime)
+
+    def clipboard_has_fields(self):
+        return self._clipboard_rows
+
+    def _clipboard_changed(self):
+        # Only the typed payload or TSV with a CODICE header count as rows. Once something else is
+        # copied, anywhere, this window's own copy or pending cut is stale and no longer pasted
+        # (the cut rows stay gone, undoing the cut brings them back).
+        mime = QApplication.clipboard().mimeData()
+        if mime is not None and mime.hasFormat(MIME_TYPE):
+            self._clipboard_rows = True
+            stale = bytes(mime.data(MIME_TYPE)) != self._clipboard_payload
+        else:
+            self._clipboard_rows = mime is not None and mime.hasText() and has_header(mime.text())
+            stale = True
+        if stale:
+            self._copied_fields = []
+            self._cut_fields = []
+            self._cut_origin_rows = []
+        self.update_edit_actions()
+
+    @timed("MainWindow.clipboard_fields")
+    def clipboard_fields(self):
+        # FormFields parsed from the clipboard in one go; None when it holds no rows, [] when they are invalid
+        mime = QApplication.clipboard().mimeData()
+        if mime is None:
+            return None
+        try:
+            if mime.hasFormat(MIME_TYPE):
+                return fields_from_payload(bytes(mime.data(MIME_TYPE)))
+            if mime.hasText():
+                return fields_from_tsv(mime.text())
+        except (ValueError, KeyError, TypeError) as e:
+            QMessageBox.warning(self, "Incolla", f"Gli appunti non contengono righe valide: {e}")
+            return []
+        return None
 
     def load_file(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Apri file Excel Dati Specifici", "", "Excel Files (*.xlsx *.xls)")
+        paths, _ = QFileDialog.getOpenFileNames(self, "Apri file Excel Dati Specifici", "", "Excel Files (*.xlsx *.xls)")
+        if paths:
+            self.open_files(paths)
+
+    def open_files(self, paths):
+        # The first workbook replaces this window's document, every other one gets its own window.
+        # They all load in parallel on the I/O pool while the windows stay responsive.
+        windows = [self] + [self.new_window() for _ in paths[1:]]
+        for window, path in zip(windows, paths):
+            window.start_load(path)
+
+    def new_window(self):
+        window = MainWindow(legacy_table=self.legacy_table)
+        window.show()
+        MainWindow.windows.append(window)
+        return window
+
+    def start_load(self, path):
+        return self._load_then(path, self.set_document)
+
+    def _load_then(self, path, callback):
+        # Loads a workbook on the I/O pool and hands the FormDocument to callback
+        job = IoJob(load_excel_file, path)
+        self._track_job(job, f"Apertura di {os.path.basename(path)}...")
+        job.signals.finished.connect(callback)
+        job.signals.failed.connect(lambda message: QMessageBox.critical(self, "Error", message))
+        self.io.start(job)
+        return job
+
+    def compare_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Confronta con file Excel", "", "Excel Files (*.xlsx *.xls)")
         if path:
-            try:
-                self.document = load_excel_file(path)
-                self.refresh_table()
-                self.add_field_action.setEnabled(True)
-                self.add_field_action_b.setEnabled(True)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", str(e))
+            self._load_then(path, lambda other: self.show_diff(other, os.path.basename(path)))
+
+    def show_diff(self, other: FormDocument, name):
+        # The other workbook is the old side: the list reads as what this document changed
+        dialog = DiffDialog(f"Differenze da {name}", changes=diff_documents(other, self.document), parent=self)
+        dialog.row_activated.connect(self.reveal_row)
+        dialog.show()
+
+    def merge_file(self):
+        # This document is "ours"; the result opens in a new window, nothing here is changed
+        filters = "Excel Files (*.xlsx *.xls)"
+        base_path, _ = QFileDialog.getOpenFileName(self, "Unisci: versione di partenza comune", "", filters)
+        if not base_path:
+            return
+        their_path, _ = QFileDialog.getOpenFileName(self, "Unisci: versione da unire a questa", "", filters)
+        if not their_path:
+            return
+        self._load_then(base_path, lambda base: self._load_then(
+            their_path, lambda theirs: self.show_merge(base, theirs)))
+
+    def show_merge(self, base: FormDocument, theirs: FormDocument):
+        merged, conflicts = merge_documents(base, self.document, theirs)
+        window = self.new_window()
+        window.set_document(merged)
+        if conflicts:
+            DiffDialog("Conflitti dell'unione", conflicts=conflicts, parent=window).show()
+
+    def reveal_row(self, row):
+        if row < len(self.document):
+            self.table.select_rows([row])
+            index = self.table.model().index(self.table.view_row(row), 0)
+            if index.isValid():
+                self.table.scrollTo(index)
+
+    def set_document(self, document: FormDocument):
+        self.document = document
+        self.search_index.close()
+        self.search_index = SearchIndex(document)
+        self.group_index.close()
+        self.group_index = GroupIndex(document)
+        self._attach_validator()
+        if self.journal is not None:
+            self.journal.attach(document)
+        if not self.legacy_table:
+            self.filter_model.expand_all()
+        self.history.clear()
+        self.refresh_table()
+        self.add_field_action.setEnabled(True)
+        self.add_field_action_b.setEnabled(True)
 
     def export_file(self):
         path, _ = QFileDialog.getSaveFileName(self, "Salva file Excel Dati Specifici", "", "Excel Files (*.xlsx)")
         if path:
-            try:
-                save_excel_file(path, self.document)
-                QMessageBox.information(self, "Export", "Fatto")
-            except Exception as e:
-                QMessageBox.critical(self, "Errore", str(e))
+            self.start_save(path)
+
+    def start_save(self, path):
+        # The worker writes a copy, so editing can go on while it runs
+        job = IoJob(save_excel_file, path, self.document.copy())
+        self._track_job(job, f"Salvataggio di {os.path.basename(path)}...")
+        job.signals.finished.connect(lambda _: QMessageBox.information(self, "Export", "Fatto"))
+        job.signals.failed.connect(lambda message: QMessageBox.critical(self, "Errore", message))
+        self._saves.add(job)
+        self._last_save = job
+        for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+            signal.connect(lambda *_, done=job: self._saves.discard(done))
+        self.io.start(job)
+        return job
+
+    def _track_job(self, job, label):
+        dialog = QProgressDialog(label, "Annulla", 0, 0, self)
+        dialog.setWindowModality(Qt.WindowModality.NonModal)
+        dialog.setMinimumDuration(400)
+        dialog.canceled.connect(job.cancel)
+
+        def progress(done, total):
+            if total and dialog.maximum() != total:
+                dialog.setMaximum(total)
+            dialog.setValue(min(done, total) if total else done)
+
+        job.signals.progress.connect(progress)
+        for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+            signal.connect(lambda *_: dialog.reset())
+
+    def closeEvent(self, event):
+        # Loads are dropped, saves are waited for: cancelling one would leave the file unwritten
+        for job in list(self.io.jobs):
+            if job not in self._saves:
+                job.cancel()
+        if self._saves:
+            self.statusBar().showMessage("Attendere il termine del salvataggio...")
+        self.io.wait()
+        if self.journal is not None:
+            # The autosave is kept for recovery unless the last save made it to disk
+            self.journal.close(discard=self._last_save is None or self._last_save.outcome == "finished")
+            self.journal = None
+        super().closeEvent(event)
+
+    def _journal_state_changed(self, error):
+        # A failed write is retried by starting over from a snapshot of the live document
+        if error is None:
+            self.statusBar().showMessage("Salvataggio automatico ripristinato", 5000)
+            return
+        self.statusBar().showMessage(f"Salvataggio automatico interrotto: {error}")
+        if not self._journal_warned:
+            self._journal_warned = True
+            QMessageBox.warning(self, "Salvataggio automatico",
+                                f"Impossibile scrivere il salvataggio automatico:\n{error}\n\n"
+                                f"Nuovo tentativo tra {JOURNAL_RETRY_SECONDS} secondi.")
+        QTimer.singleShot(JOURNAL_RETRY_SECONDS * 1000, self._reopen_journal)
+
+    def _reopen_journal(self):
+        if self.journal is not None and self.journal.error is not None:
+            self.journal.attach(self.document)
+
+    def offer_recovery(self):
+        # Journals left by a session that never closed its windows (crash, power loss).
+        # Recovered documents open in this window if it is still empty, otherwise in new ones.
+        sessions = pending_sessions()
+        if not sessions:
+            return
+        lines = [f"{time.strftime('%d/%m/%Y %H:%M', time.localtime(saved))} – {fields} campi"
+                 for _, saved, fields in sessions]
+        answer = QMessageBox.question(
+            self, "Recupero documenti",
+            "Sono stati trovati documenti non salvati di una sessione interrotta:\n\n" + "\n".join(lines)
+            + "\n\nRecuperarli? (No li elimina, Annulla li tiene per il prossimo avvio)",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel)
+        if answer == QMessageBox.StandardButton.Cancel:
+            return
+        for session, _, _ in sessions:
+            if answer == QMessageBox.StandardButton.Yes:
+                try:
+                    document = recover(session)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    QMessageBox.critical(self, "Recupero documenti", f"Recupero non riuscito: {e}")
+                    continue
+                window = self if not len(self.document) and not self.history.can_undo() else self.new_window()
+                window.set_document(document)
+            discard(session)
+
+    def apply_filter(self):
+        query = self.search_bar.query()
+        try:
+            matches = self.search_index.search(query, self.search_bar.attrs(), self.search_bar.regex())
+        except re.error as e:
+            self.search_bar.set_status(f"Regex non valida: {e}")
+            return
+        if self.legacy_table:
+            for row, field in enumerate(self.document.fields):
+                self.table.setRowHidden(row, matches is not None and field not in matches)
+        else:
+            self.filter_model.set_matches(matches)
+        self.search_bar.set_status("" if matches is None else f"{len(matches)} risultati")
+
+    def _refilter(self, *_):
+        # While a command runs the filter is refreshed once at its end (see _run), not per signal
+        if self._refilter_paused:
+            self._refilter_pending = True
+        elif self.search_bar.query().strip():
+            self.apply_filter()
+
+    def _run(self, apply, *args):
+        self._refilter_paused = True
+        self._refilter_pending = False
+        try:
+            apply(*args, self.table_model)
+        finally:
+            self._refilter_paused = False
+        if self._refilter_pending:
+            self._refilter()
+
+    def replace_all(self):
+        # Every replacement in the matching fields is one undo step
+        try:
+            plan = self.search_index.replace_plan(self.search_bar.query(), self.search_bar.replacement(),
+                                                  self.search_bar.attrs(), self.search_bar.regex())
+        except re.error as e:
+            self.search_bar.set_status(f"Regex non valida: {e}")
+            return
+        if plan:
+            # One batch per attribute: a single model notification (and refilter) each, not one per row
+            changes = {}
+            for row, attr, value in plan:
+                changes.setdefault(attr, {})[row] = value
+            self.execute(CommandGroup([SetValues.per_row(values, attr) for attr, values in changes.items()],
+                                      "Sostituisci"))
+        self.search_bar.set_status(f"{len(plan)} sostituzioni")
+
+    def _attach_validator(self):
+        if self.validator is not None:
+            self.validator.close()
+        self.validator = Validator(self.document)
+        self.validator.listener = self._issues_changed
+        self.table_model.validator = self.validator
+
+    def _issues_changed(self, fields):
+        # Called from inside document changes, possibly between a model's begin/end pair, so the
+        # repaint of the affected code cells waits for the event loop
+        if not self._unvalidated_cells:
+            QTimer.singleShot(0, self._repaint_issues)
+        self._unvalidated_cells.update(fields)
+
+    def _repaint_issues(self):
+        fields, self._unvalidated_cells = self._unvalidated_cells, set()
+        document = self.document.fields
+        for field in fields:
+            row = field.order // 100
+            if row < len(document) and document[row] is field:
+                index = self.table_model.index(row, CODE_COLUMN)
+                self.table_model.dataChanged.emit(index, index, [Qt.ItemDataRole.BackgroundRole])
+
+    def show_issues(self):
+        issues = self.validator.issues()
+        if not issues:
+            QMessageBox.information(self, "Verifica", "Nessun problema trovato.")
+            return
+        lines = [f"Riga {row + 1} – {code}: {message}" for row, code, _, message in issues[:50]]
+        if len(issues) > 50:
+            lines.append(f"... e altri {len(issues) - 50}")
+        QMessageBox.warning(self, "Verifica", f"{len(issues)} problemi:\n\n" + "\n".join(lines))
+
+    def show_performance(self):
+        from ui.perf_dialog import PerformanceDialog
+        PerformanceDialog(self).exec()
 
+    @timed("MainWindow.refresh_table")
     def refresh_table(self):
+        self.table_model.set_document(self.document)
+
+    @timed("MainWindow.fill_table_widget")
+    def fill_table_widget(self):
         self._suppress_signal = True
         self.table.setRowCount(len(self.document.fields))
         for i, field in enumerate(self.document.fields):
@@ -288,7 +688,8 @@ class MainWindow(QMainWindow):
             combo.currentTextChanged.connect(lambda label, row=i: self.update_type(row, FIELD_TYPES[label]))
             self.table.setCellWidget(i, 1, combo)
 
-            self.table.setItem(i, 2, QTableWidgetItem(field.description))
+            self.table.setItem(i, 2, QTableWidgetItem())
+            self._set_description_item(self.table.item(i, 2), field)
             self.table.setItem(i, 3, QTableWidgetItem(field.group or ""))
 
             checkbox = QCheckBox()
@@ -303,69 +704,91 @@ class MainWindow(QMainWindow):
 
             self.table.setItem(i, 5, QTableWidgetItem(str(field.default_data)))
 
-            selection = self.table.selectionModel().selectedRows()
-            has_selection = bool(selection)
-
-            self.copy_action.setEnabled(has_selection)
-            self.cut_action.setEnabled(has_selection)
-            self.paste_action.setEnabled(has_selection and bool(self._cut_fields))
-            self.assign_group_action.setEnabled(has_selection)
-            self.toggle_mandatory_action.setEnabled(has_selection)
+        self._suppress_signal = False
+        self.update_edit_actions()
 
+    @timed("MainWindow.update_table_widget_rows")
+    def update_table_widget_rows(self, first, last):
+        self._suppress_signal = True
+        for i in range(first, min(last + 1, len(self.document.fields))):
+            field = self.document.fields[i]
+            self.table.item(i, 0).setText(field.code)
+            combo = self.table.cellWidget(i, 1)
+            combo.blockSignals(True)
+            combo.setCurrentText(next((k for k, v in FIELD_TYPES.items() if v == field.data_type), ""))
+            combo.blockSignals(False)
+            self._set_description_item(self.table.item(i, 2), field)
+            self.table.item(i, 3).setText(field.group or "")
+            checkbox = self.table.cellWidget(i, 4).findChild(QCheckBox)
+            checkbox.blockSignals(True)
+            checkbox.setChecked(bool(field.mandatory))
+            checkbox.blockSignals(False)
+            self.table.item(i, 5).setText(str(field.default_data))
         self._suppress_signal = False
 
-    def sync_table_to_model(self):
+    @staticmethod
+    def _set_description_item(item, field):
+        # AN fields show a cached plain-text preview and are edited only through the HTML dialog
+        if field.data_type == "AN":
+            item.setText(preview(field.description))
+            item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        else:
+            item.setText(field.description)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
+
+    @timed("MainWindow.sync_table_to_model")
+    def sync_table_to_model(self, row, column):
+        # cellChanged passes the edited cell, so only that attribute is written back
         if self._suppress_signal:
             return
-        for i, field in enumerate(self.document.fields):
-            # Column 0: Code
-            field.code = self.table.item(i, 0).text()
-
-            # Column 1: Type (QComboBox)
-            combo = self.table.cellWidget(i, 1)
-            if combo and isinstance(combo, QComboBox):
-                label = combo.currentText()
-                field.data_type = FIELD_TYPES.get(label, label)
-
-            # Column 2: Description
-            field.description = self.table.item(i, 2).text()
-
-            # Column 3: Group
-            field.group = self.table.item(i, 3).text() or None
-
-            field.default_data = self.table.item(i, 5).text()
+        if 0 <= row < len(self.document.fields):
+            item = self.table.item(row, column)
+            if item is not None and COLUMNS[column][1] in ("code", "description", "group", "default_data"):
+                self.execute(SetValue(row, COLUMNS[column][1], item.text()))
+        self.dump_document()
 
-        print(self.document)
+    def dump_document(self):
+        if DEBUG_DUMP:
+            print(self.document)
 
     def update_type(self, row, value):
         if 0 <= row < len(self.document.fields):
-            self.document.fields[row].data_type = value
+            self.execute(SetValue(row, "data_type", value))
 
     def update_mandatory(self, row):
         if 0 <= row < len(self.document.fields):
             container = self.table.cellWidget(row, 4)
             checkbox = container.findChild(QCheckBox)
             if checkbox:
-                self.document.fields[row].mandatory = checkbox.isChecked()
+                self.execute(SetValue(row, "mandatory", checkbox.isChecked()))
 
     def handle_double_click(self, row, column):
         if column == 2:
             if 0 <= row < len(self.document.fields):
                 field = self.document.fields[row]
                 if field.data_type == "AN":
+                    from ui.r_html_editor import RichTextEditorDialog  # loaded on first use
                     dialog = RichTextEditorDialog(initial_html=field.description, parent=self)
                     if dialog.exec():
                         new_html = dialog.get_html()
-                        self.document.fields[row].description = new_html
-                        self.table.item(row, 2).setText(new_html)
+                        self.execute(SetValue(row, "description", new_html))
 
     def swap_rows(self, row1, row2):
-        self.save_snapshot()
-        self.document.swap_field(row1, row2)
-        self.refresh_table()
+        self.execute(SwapFields(row1, row2))
+
+    def move_rows(self, rows, destination):
+        command = MoveFields(rows, destination)
+        self.execute(command)
+        self.table.select_rows(range(command.start, command.start + len(command.rows)))
+
+    def shift_rows(self, rows, direction):
+        command = ShiftFields(rows, direction)
+        self.execute(command)
+        if command.moved:
+            self.table.select_rows([row + direction for row in rows])
 
     def open_context_menu(self, position):
-        indexes = self.table.selectionModel().selectedRows()
+        indexes = self.selected_indexes()
         if not indexes:
             return
 
@@ -392,7 +815,7 @@ class MainWindow(QMainWindow):
         copy_action.triggered.connect(lambda: self.copy_selected_rows(indexes))
         menu.addAction(copy_action)
 
-        if self._copied_fields:
+        if self._copied_fields or self.clipboard_has_fields():
             paste_action = QAction("Incolla righe qui", self)
             paste_action.triggered.connect(lambda: self.paste_fields_at(clicked_row + 1))
             menu.addAction(paste_action)
@@ -442,32 +865,88 @@ class MainWindow(QMainWindow):
             set_type_menu.addAction(action)
         menu.addMenu(set_type_menu)
 
+        group = self.document.fields[clicked_row].group
+        if group:
+            menu.addMenu(self.group_menu(group))
+
         menu.exec(self.table.viewport().mapToGlobal(position))
 
+    def group_menu(self, group):
+        # Operations on every field of the group, wherever it is; each one is a single undo step
+        menu = QMenu(f"Gruppo «{group}»", self)
+
+        rename_action = QAction("Rinomina gruppo...", self)
+        rename_action.triggered.connect(lambda: self.rename_group(group))
+        menu.addAction(rename_action)
+
+        move_action = QAction("Sposta tutto il gruppo...", self)
+        move_action.triggered.connect(lambda: self.move_group(group))
+        menu.addAction(move_action)
+
+        menu.addSeparator()
+        for label, mandatory in (("Rendi tutto obbligatorio", True), ("Rendi tutto facoltativo", False)):
+            action = QAction(label, self)
+            action.triggered.connect(lambda _, m=mandatory: self.execute(self.group_index.set_mandatory(group, m)))
+            menu.addAction(action)
+
+        type_menu = QMenu("Imposta tipologia per il gruppo", self)
+        for label, code in FIELD_TYPES.items():
+            action = QAction(label, self)
+            action.triggered.connect(lambda _, c=code: self.execute(self.group_index.set_type(group, c)))
+            type_menu.addAction(action)
+        menu.addMenu(type_menu)
+
+        default_action = QAction("Imposta dati di default per il gruppo...", self)
+        default_action.triggered.connect(lambda: self.set_group_default_data(group))
+        menu.addAction(default_action)
+
+        if not self.legacy_table:
+            menu.addSeparator()
+            collapsed = group in self.filter_model.collapsed
+            collapse_action = QAction("Espandi gruppo" if collapsed else "Comprimi gruppo", self)
+            collapse_action.triggered.connect(lambda: self.filter_model.set_collapsed(group, not collapsed))
+            menu.addAction(collapse_action)
+            if self.filter_model.collapsed:
+                expand_action = QAction("Espandi tutti i gruppi", self)
+                expand_action.triggered.connect(self.filter_model.expand_all)
+                menu.addAction(expand_action)
+        return menu
+
+    def rename_group(self, group):
+        name, ok = QInputDialog.getText(self, "Rinomina gruppo", "Nuovo nome:", text=group)
+        if ok and name and name != group:
+            if not self.legacy_table and group in self.filter_model.collapsed:
+                self.filter_model.set_collapsed(group, False)
+                self.filter_model.set_collapsed(name, True)
+            self.execute(self.group_index.rename(group, name))
+
+    def move_group(self, group):
+        max_index = len(self.document.fields)
+        index, ok = QInputDialog.getInt(self, "Sposta gruppo", f"Sposta il gruppo prima della riga (0–{max_index}):",
+                                        value=self.group_index.rows(group)[0], min=0, max=max_index)
+        if ok:
+            command = self.group_index.move(group, index)
+            self.execute(command)
+            self.table.select_rows(range(command.start, command.start + len(command.rows)))
+
+    def set_group_default_data(self, group):
+        value, ok = QInputDialog.getText(self, "Dati di default", f"Dati di default per «{group}»:")
+        if ok:
+            self.execute(self.group_index.set_default_data(group, value))
+
     def assign_group_dialog(self, indexes):
         from PyQt6.QtWidgets import QInputDialog
         group_name, ok = QInputDialog.getText(self, "Assegna gruppo", "Gruppo...")
         if ok and group_name:
-            self.save_snapshot()
-            row_indices = [index.row() for index in indexes]
-            self.document.assign_group(row_indices, group_name)
-            self.refresh_table()
+            self.execute(SetValues([index.row() for index in indexes], "group", group_name))
 
     def toggle_mandatory(self, indexes):
-        for index in indexes:
-            row = index.row()
-            container = self.table.cellWidget(row, 4)
-            checkbox = container.findChild(QCheckBox)
-            if checkbox:
-                checkbox.setChecked(not checkbox.isChecked())
+        rows = sorted(set(index.row() for index in indexes))
+        commands = [SetValues([row], "mandatory", not self.document.fields[row].mandatory) for row in rows]
+        self.execute(CommandGroup(commands, "Obbligatorietà"))
 
     def set_type(self, indexes, data_type):
-        for index in indexes:
-            row = index.row()
-            combo = self.table.cellWidget(row, 1)
-            if combo:
-                label = next((k for k, v in FIELD_TYPES.items() if v == data_type), data_type)
-                combo.setCurrentText(label)
+        self.execute(SetValues([index.row() for index in indexes], "data_type", data_type))
 
     def prompt_field_insertion(self):
         if not self.document or not isinstance(self.document, FormDocument):
@@ -485,41 +964,13 @@ class MainWindow(QMainWindow):
         )
 
         if ok:
-            self.save_snapshot()
-            new_field = FormField.create_empty()
-            self.document.add_field(field=new_field, position=index)
-            self.refresh_table()
+            self.insert_existing_field_at(index, FormField.create_empty())
 
     def insert_field_b(self):
-        self.save_snapshot()
-        self.document.add_field(FormField.create_empty(), len(self.document))
-        self.refresh_table()
-
-    def save_snapshot(self):
-        self.undo_stack.append(self.document.copy())
-        self.redo_stack.clear()
-
-    def set_document_snapshot(self, snapshot):
-        self._suppress_signal = True
-        self.table.blockSignals(True)  # blocca TUTTI i segnali widget → slot
-
-        self.document = snapshot
-        self.refresh_table()
-
-        self.table.blockSignals(False)
-        self._suppress_signal = False
+        self.insert_existing_field_at(len(self.document), FormField.create_empty())
 
     def undo(self):
-        if not self.undo_stack:
-            return
-        self.redo_stack.append(self.document.copy())
-        # print("miao")
-        snapshot = self.undo_stack.pop()
-        self.set_document_snapshot(snapshot)
+        self._run(self.history.undo)
 
     def redo(self):
-        if not self.redo_stack:
-            return
-        self.undo_stack.append(self.document.copy())
-        snapshot = self.redo_stack.pop()
-        self.set_document_snapshot(snapshot)
+        self._run(self.history.redo)
@@ -0,0 +1,42 @@
+from PyQt6.QtGui import QFontDatabase
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton
+
+from core import perf
+
+
+class PerformanceDialog(QDialog):
+    # Shows the timers and counters collected by core.perf since start (or the last reset)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Prestazioni")
+        self.setMinimumSize(800, 450)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+
+        refresh_button = QPushButton("Aggiorna")
+        refresh_button.clicked.connect(self.refresh)
+        reset_button = QPushButton("Azzera")
+        reset_button.clicked.connect(self.reset)
+        close_button = QPushButton("Chiudi")
+        close_button.clicked.connect(self.accept)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(refresh_button)
+        buttons.addWidget(reset_button)
+        buttons.addStretch()
+        buttons.addWidget(close_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.text)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        self.text.setPlainText(perf.report())
+
+    def reset(self):
+        perf.reset()
+        self.refresh()
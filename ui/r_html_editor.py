@@ -6,7 +6,31 @@ from PyQt6.QtGui import (
     QTextCharFormat, QTextCursor, QFont, QKeySequence, QColor, QAction
 )
 from PyQt6.QtCore import Qt
-import re
+from collections import OrderedDict
+
+from core.html_text import normalize_fragment
+
+MAX_CACHED_DOCUMENTS = 64
+_documents = OrderedDict()  # (hash, length) of a stored fragment -> its parsed QTextDocument
+
+
+def _cache_key(html):
+    return hash(html), len(html)
+
+
+def _cached_document(html):
+    document = _documents.get(_cache_key(html))
+    if document is not None:
+        _documents.move_to_end(_cache_key(html))
+    return document
+
+
+def _remember_document(html, document):
+    # A clone, because the dialog's own document goes away with the dialog
+    _documents[_cache_key(html)] = document.clone()
+    _documents.move_to_end(_cache_key(html))
+    if len(_documents) > MAX_CACHED_DOCUMENTS:
+        _documents.popitem(last=False)
 
 
 class RichTextEditorDialog(QDialog):
@@ -17,7 +41,12 @@ class RichTextEditorDialog(QDialog):
 
         self.text_edit = QTextEdit()
         self.text_edit.setAcceptRichText(True)
-        self.text_edit.setHtml(initial_html)
+        cached = _cached_document(initial_html)
+        if cached is not None:
+            # reopening a field edited in this session: no HTML parsing
+            self.text_edit.setDocument(cached.clone(self.text_edit))
+        else:
+            self.text_edit.setHtml(initial_html)
 
         self.toolbar = QToolBar()
 
@@ -167,8 +196,7 @@ class RichTextEditorDialog(QDialog):
         return self.get_html_fragment()
 
     def get_html_fragment(self):
-        full_html = self.text_edit.toHtml()
-        match = re.search(r'<body[^>]*>(.*?)</body>', full_html, re.DOTALL | re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
-        return full_html  # fallback, nel caso non trovi il body
+        # Body content only, without the styling Qt repeats on every block and span
+        fragment = normalize_fragment(self.text_edit.toHtml())
+        _remember_document(fragment, self.text_edit.document())
+        return fragment
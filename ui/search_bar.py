@@ -0,0 +1,69 @@
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QLineEdit, QComboBox, QCheckBox, QPushButton, QLabel
+
+from core.search import SEARCH_ATTRIBUTES
+
+SCOPES = [
+    ("Tutte le colonne", SEARCH_ATTRIBUTES),
+    ("Codice", ("code",)),
+    ("Descrizione", ("description",)),
+    ("Raggruppamento", ("group",)),
+    ("Tipologia", ("data_type",)),
+]
+
+
+class SearchBar(QWidget):
+    # Only collects the query; MainWindow runs it against its SearchIndex
+    search_changed = pyqtSignal()
+    replace_requested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Cerca...")
+        self.query_edit.setClearButtonEnabled(True)
+        self.query_edit.textChanged.connect(self.search_changed)
+
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItems([label for label, _ in SCOPES])
+        self.scope_combo.currentIndexChanged.connect(self.search_changed)
+
+        self.regex_check = QCheckBox("Regex")
+        self.regex_check.toggled.connect(self.search_changed)
+
+        self.replace_edit = QLineEdit()
+        self.replace_edit.setPlaceholderText("Sostituisci con...")
+
+        replace_button = QPushButton("Sostituisci tutto")
+        replace_button.clicked.connect(self.replace_requested)
+
+        self.status_label = QLabel()
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.query_edit, 3)
+        layout.addWidget(self.scope_combo)
+        layout.addWidget(self.regex_check)
+        layout.addWidget(self.replace_edit, 2)
+        layout.addWidget(replace_button)
+        layout.addWidget(self.status_label)
+
+    def query(self):
+        return self.query_edit.text()
+
+    def attrs(self):
+        return SCOPES[self.scope_combo.currentIndex()][1]
+
+    def regex(self):
+        return self.regex_check.isChecked()
+
+    def replacement(self):
+        return self.replace_edit.text()
+
+    def set_status(self, text):
+        self.status_label.setText(text)
+
+    def focus(self):
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
@@ -0,0 +1,272 @@
+# ui/table_model.py
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt6.QtGui import QColor
+
+from core.html_text import preview
+from core.model import FormDocument, FIELD_TYPES
+from core.undo import SetValue
+
+COLUMNS = [
+    ("Codice", "code"),
+    ("Tipologia", "data_type"),
+    ("Descrizione", "description"),
+    ("Raggruppamento", "group"),
+    ("Campo obbligatorio", "mandatory"),
+    ("Dati di default", "default_data"),
+]
+ATTRIBUTE_COLUMNS = {attr: column for column, (_, attr) in enumerate(COLUMNS)}
+TYPE_LABELS = {code: label for label, code in FIELD_TYPES.items()}
+
+CODE_COLUMN = ATTRIBUTE_COLUMNS["code"]
+TYPE_COLUMN = ATTRIBUTE_COLUMNS["data_type"]
+DESCRIPTION_COLUMN = ATTRIBUTE_COLUMNS["description"]
+MANDATORY_COLUMN = ATTRIBUTE_COLUMNS["mandatory"]
+# Columns to repaint when an attribute changes: the description cell's text (AN preview) and its
+# editable flag follow the type too
+ATTRIBUTE_SPANS = {attr: (column, column) for attr, column in ATTRIBUTE_COLUMNS.items()}
+ATTRIBUTE_SPANS["data_type"] = (min(TYPE_COLUMN, DESCRIPTION_COLUMN), max(TYPE_COLUMN, DESCRIPTION_COLUMN))
+
+ISSUE_COLOR = QColor(255, 214, 214)
+
+
+class FormTableModel(QAbstractTableModel):
+    # Every change to the document made by the UI goes through this model, so views get
+    # fine-grained notifications instead of being rebuilt.
+    def __init__(self, document: FormDocument, parent=None, undo_stack=None):
+        super().__init__(parent)
+        self.document = document
+        self.undo_stack = undo_stack  # edits made in the view are recorded here
+        self.validator = None  # a core.validation.Validator; its issues are highlighted on the code
+
+    @property
+    def fields(self):
+        return self.document.fields
+
+    def set_document(self, document: FormDocument):
+        self.beginResetModel()
+        self.document = document
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.document.fields)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        field = self.document.fields[index.row()]
+        attr = COLUMNS[index.column()][1]
+        if role == Qt.ItemDataRole.EditRole:
+            return getattr(field, attr)
+        if attr == "code" and self.validator is not None and role in (Qt.ItemDataRole.BackgroundRole,
+                                                                      Qt.ItemDataRole.ToolTipRole):
+            issues = self.validator.issues_for(field)
+            if not issues:
+                return None
+            return ISSUE_COLOR if role == Qt.ItemDataRole.BackgroundRole else "\n".join(m for _, m in issues)
+        if role == Qt.ItemDataRole.DisplayRole:
+            if attr == "mandatory":
+                return None
+            if attr == "data_type":
+                return TYPE_LABELS.get(field.data_type, field.data_type)
+            if attr == "description" and field.data_type == "AN":
+                # the full HTML only leaves the model through EditRole, i.e. for the editor dialog
+                return preview(field.description)
+            value = getattr(field, attr)
+            return "" if value is None else str(value)
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.ItemIsDropEnabled
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsDragEnabled
+        column = index.column()
+        if column == DESCRIPTION_COLUMN and self.document.fields[index.row()].data_type == "AN":
+            return flags  # edited through the rich text dialog
+        if column != MANDATORY_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def supportedDropActions(self):
+        return Qt.DropAction.MoveAction
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        if self.undo_stack is None:
+            return self.set_value(index.row(), COLUMNS[index.column()][1], value)
+        if getattr(self.document.fields[index.row()], COLUMNS[index.column()][1]) != value:
+            self.undo_stack.push(SetValue(index.row(), COLUMNS[index.column()][1], value), self)
+        return True
+
+    def set_value(self, row, attr, value):
+        if not 0 <= row < len(self.document.fields):
+            return None
+        displaced = self.document.set_value(row, attr, value)
+        span = ATTRIBUTE_SPANS.get(attr)
+        if span is not None:
+            self.dataChanged.emit(self.index(row, span[0]), self.index(row, span[1]))
+        self._codes_changed([displaced] if displaced else [])
+        return displaced
+
+    def set_values(self, rows, attr, values):
+        rows = list(rows)
+        displaced = self.document.set_values(rows, attr, values)
+        span = ATTRIBUTE_SPANS.get(attr)
+        shown = [row for row in rows if 0 <= row < len(self.document.fields)]
+        if span is not None and shown:
+            self.dataChanged.emit(self.index(min(shown), span[0]), self.index(max(shown), span[1]))
+        self._codes_changed(displaced)
+        return displaced
+
+    def rows_changed(self, rows):
+        rows = [row for row in rows if 0 <= row < len(self.document.fields)]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), len(COLUMNS) - 1))
+
+    # The methods below mirror FormDocument's batch API, so undo commands can run against either.
+    # Each one is a single document call wrapped in a single view notification.
+
+    def insert_many(self, position, fields):
+        fields = list(fields)
+        position = max(0, min(position, len(self.document.fields)))
+        if not fields:
+            return []
+        self.beginInsertRows(QModelIndex(), position, position + len(fields) - 1)
+        displaced = self.document.insert_many(position, fields)
+        self.endInsertRows()
+        # existing rows renamed by the insert are announced now that the new rows exist
+        self._codes_changed(displaced)
+        return displaced
+
+    def delete_many(self, rows):
+        rows = sorted(set(row for row in rows if 0 <= row < len(self.document.fields)))
+        if not rows:
+            return []
+        if rows[-1] - rows[0] + 1 == len(rows):
+            self.beginRemoveRows(QModelIndex(), rows[0], rows[-1])
+            removed = self.document.delete_many(rows)
+            self.endRemoveRows()
+        else:
+            # Qt can only remove contiguous ranges; a scattered selection is a single reset instead
+            self.beginResetModel()
+            removed = self.document.delete_many(rows)
+            self.endResetModel()
+        return removed
+
+    def move_block(self, rows, destination):
+        rows = sorted(set(rows))
+        if rows and rows[-1] - rows[0] + 1 == len(rows):
+            if rows[0] <= destination <= rows[-1] + 1:
+                return rows[0]
+            self.beginMoveRows(QModelIndex(), rows[0], rows[-1], QModelIndex(), destination)
+            start = self.document.move_block(rows, destination)
+            self.endMoveRows()
+            return start
+        return self._reorder(lambda: self.document.move_block(rows, destination))
+
+    def restore_block(self, start, rows):
+        rows = sorted(set(rows))
+        if rows and rows[-1] - rows[0] + 1 == len(rows):
+            if rows[0] == start:
+                return
+            destination = rows[0] + len(rows) if rows[0] > start else rows[0]
+            self.beginMoveRows(QModelIndex(), start, start + len(rows) - 1, QModelIndex(), destination)
+            self.document.restore_block(start, rows)
+            self.endMoveRows()
+        else:
+            self._reorder(lambda: self.document.restore_block(start, rows))
+
+    def shift_rows(self, rows, direction):
+        rows = sorted(set(rows))
+        if rows and rows[-1] - rows[0] + 1 == len(rows):
+            if not (0 <= rows[0] + direction and rows[-1] + direction < len(self.document.fields)):
+                return False
+            destination = rows[0] - 1 if direction < 0 else rows[-1] + 2
+            self.beginMoveRows(QModelIndex(), rows[0], rows[-1], QModelIndex(), destination)
+            moved = self.document.shift_rows(rows, direction)
+            self.endMoveRows()
+            return moved
+        return self._reorder(lambda: self.document.shift_rows(rows, direction))
+
+    def swap_field(self, row_1, row_2):
+        if abs(row_1 - row_2) == 1:
+            self.shift_rows([min(row_1, row_2)], 1)
+        else:
+            self.document.swap_field(row_1, row_2)
+            self.rows_changed([row_1])
+            self.rows_changed([row_2])
+
+    def _reorder(self, change):
+        # Rows change places without being added or removed: one layout change,
+        # persistent indexes (selection, current cell) follow their fields.
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        fields = [self.document.fields[index.row()] for index in persistent]
+        result = change()
+        self.changePersistentIndexList(
+            persistent, [self.index(field.order // 100, index.column()) for field, index in zip(fields, persistent)])
+        self.layoutChanged.emit()
+        return result
+
+    def _codes_changed(self, displaced):
+        # Fields that lost their code to an earlier one were renamed by the document. Called once the
+        # structural change is over (after end*Rows), when the rows are valid model indexes: one
+        # dataChanged over the code cells of every renamed neighbour.
+        rows = [field.order // 100 for field, _ in displaced]
+        rows = [row for row in rows if 0 <= row < len(self.document.fields)]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), CODE_COLUMN), self.index(max(rows), CODE_COLUMN))
+
+
+class FormFilterProxy(QSortFilterProxyModel):
+    # Shows only the fields of the last search, with collapsed groups reduced to the first row of
+    # each run; the document order is kept (no sorting)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.matches = None  # set of FormFields to show, None for all
+        self.collapsed = set()  # group names
+
+    def set_matches(self, matches):
+        if matches is None and self.matches is None:
+            return
+        self.matches = matches
+        self.invalidateFilter()
+
+    def set_collapsed(self, group, collapsed=True):
+        if collapsed:
+            self.collapsed.add(group)
+        else:
+            self.collapsed.discard(group)
+        self.invalidateFilter()
+
+    def expand_all(self):
+        if self.collapsed:
+            self.collapsed.clear()
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        fields = self.sourceModel().fields
+        field = fields[source_row]
+        if self.matches is not None and field not in self.matches:
+            return False
+        if self.collapsed and field.group in self.collapsed and source_row > 0:
+            return fields[source_row - 1].group != field.group
+        return True
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        # Collapsed group rows are marked in the row header
+        if self.collapsed and orientation == Qt.Orientation.Vertical and role == Qt.ItemDataRole.DisplayRole:
+            source_row = self.mapToSource(self.index(section, 0)).row()
+            if source_row >= 0 and self.sourceModel().fields[source_row].group in self.collapsed:
+                return f"▸ {source_row + 1}"
+        return super().headerData(section, orientation, role)
@@ -1,16 +1,40 @@
-from PyQt6.QtWidgets import QTableWidget, QTableWidgetItem
-from PyQt6.QtGui import QDropEvent
-
-from PyQt6.QtWidgets import QTableWidget, QAbstractItemView
-from PyQt6.QtGui import QDropEvent, QDragMoveEvent, QDragEnterEvent, QCursor
-from PyQt6.QtCore import Qt, QMimeData, QDataStream, QIODevice, QPoint
-from PyQt6.QtWidgets import QAbstractItemView
-from PySide6.QtGui import QKeyEvent
-
-from core.model import FIELD_TYPES
-
-
-class DraggableTableWidget(QTableWidget):
+from PyQt6.QtWidgets import QTableWidget, QAbstractItemView, QTableView
+from PyQt6.QtGui import QDropEvent, QKeyEvent
+from PyQt6.QtCore import Qt, QDataStream, QIODevice, QItemSelection, QItemSelectionModel, QAbstractProxyModel
+
+
+class RowSelectionMixin:
+    # Rows given and returned are document rows, even when the view shows a filtered proxy
+    def source_row(self, index):
+        model = self.model()
+        return model.mapToSource(index).row() if isinstance(model, QAbstractProxyModel) else index.row()
+
+    def view_row(self, row):
+        # -1 when the row is filtered out
+        model = self.model()
+        if isinstance(model, QAbstractProxyModel):
+            return model.mapFromSource(model.sourceModel().index(row, 0)).row()
+        return row
+
+    def source_row_count(self):
+        model = self.model()
+        return model.sourceModel().rowCount() if isinstance(model, QAbstractProxyModel) else model.rowCount()
+
+    def selected_rows(self):
+        return sorted(set(self.source_row(index) for index in self.selectionModel().selectedRows()))
+
+    def select_rows(self, rows):
+        model = self.model()
+        selection = QItemSelection()
+        shown = [row for row in (self.view_row(row) for row in rows) if row >= 0]
+        for row in shown:
+            selection.select(model.index(row, 0), model.index(row, model.columnCount() - 1))
+        self.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        if shown:
+            self.selectionModel().setCurrentIndex(model.index(shown[0], 0), QItemSelectionModel.SelectionFlag.NoUpdate)
+
+
+class DraggableTableWidget(RowSelectionMixin, QTableWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_window = parent
@@ -53,16 +77,18 @@ class DraggableTableWidget(QTableWidget):
 
         # Case 2: Drop visually inside a row instead of between rows → reject
         indicator = self.dropIndicatorPosition()
-        print(indicator)
         if indicator == QAbstractItemView.DropIndicatorPosition.OnItem:
             event.ignore()
             return
 
-        # All checks passed → proceed with default behavior
-        super().dropEvent(event)
+        if indicator == QAbstractItemView.DropIndicatorPosition.BelowItem:
+            drop_row += 1
 
+        # All checks passed → the window moves the rows through its model (one undo step)
+        event.setDropAction(Qt.DropAction.IgnoreAction)
+        event.accept()
         if self.parent_window:
-            self.parent_window.sync_table_to_model()
+            self.parent_window.move_rows(rows_to_move, drop_row)
 
     def keyPressEvent(self, event: QKeyEvent):
         if event.key() == Qt.Key.Key_Escape:
@@ -80,36 +106,90 @@ class DraggableTableWidget(QTableWidget):
         super().keyPressEvent(event)
 
     def move_selected_rows(self, direction: int):
-        indexes = self.selectedIndexes()
-        rows = sorted(set(i.row() for i in indexes))
-        new_rows = [r + direction for r in rows]
+        rows = self.selected_rows()
         if not rows:
             return
 
         if (direction == -1 and rows[0] == 0) or (direction == 1 and rows[-1] == self.rowCount() - 1):
             return
 
-        for row in (rows if direction == 1 else reversed(rows)):
-            self.swap_rows(row, row + direction)
+        self.parent_window.shift_rows(rows, direction)
+
+    def swap_rows(self, row1, row2):
+        self.parent_window.swap_rows(row1, row2)
+
+    def leaveEvent(self, event):
+        # Reset cursor when leaving the widget
+        self.setCursor(Qt.CursorShape.ArrowCursor)
+        super().leaveEvent(event)
+
 
-        self.clearSelection()
+class DraggableTableView(RowSelectionMixin, QTableView):
+    # Model/view counterpart of DraggableTableWidget: rows are moved through the window's
+    # FormTableModel, no cell widget is ever created.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent_window = parent
 
-        current_row = indexes[0].row()
-        new_row = current_row + direction
+    def dropEvent(self, event: QDropEvent):
+        if event.source() is not self:
+            event.ignore()
+            return
 
-        for row in new_rows:
-            if 0 <= row < self.rowCount():
-                for col in range(self.columnCount()):
-                    item = self.item(row, col)
-                    if item:  # Evita None
-                        item.setSelected(True)
+        rows_to_move = self.selected_rows()
+        indicator = self.dropIndicatorPosition()
+        if not rows_to_move or indicator == QAbstractItemView.DropIndicatorPosition.OnItem:
+            event.ignore()
+            return
+
+        drop_index = self.indexAt(event.position().toPoint())
+        if not drop_index.isValid():
+            drop_row = self.source_row_count()
+        else:
+            drop_row = self.source_row(drop_index)
+            if indicator == QAbstractItemView.DropIndicatorPosition.BelowItem:
+                drop_row += 1
 
-        self.setCurrentCell(new_row, 0)
+        # Dropping a contiguous block right onto itself changes nothing
+        first, last = rows_to_move[0], rows_to_move[-1] + 1
+        if last - first == len(rows_to_move) and first <= drop_row <= last:
+            event.ignore()
+            return
+
+        # The move is done by the model, Qt must not remove the dragged rows afterwards
+        event.setDropAction(Qt.DropAction.IgnoreAction)
+        event.accept()
+        if self.parent_window:
+            self.parent_window.move_rows(rows_to_move, drop_row)
+
+    def keyPressEvent(self, event: QKeyEvent):
+        if event.key() == Qt.Key.Key_Escape:
+            self.clearSelection()
+            return
+
+        if event.modifiers() == Qt.KeyboardModifier.ControlModifier:
+            if event.key() == Qt.Key.Key_Up:
+                self.move_selected_rows(-1)
+                return
+            elif event.key() == Qt.Key.Key_Down:
+                self.move_selected_rows(1)
+                return
+
+        super().keyPressEvent(event)
+
+    def move_selected_rows(self, direction: int):
+        rows = self.selected_rows()
+        if not rows:
+            return
+
+        if (direction == -1 and rows[0] == 0) or (direction == 1 and rows[-1] == self.source_row_count() - 1):
+            return
+
+        self.parent_window.shift_rows(rows, direction)
 
     def swap_rows(self, row1, row2):
         self.parent_window.swap_rows(row1, row2)
 
     def leaveEvent(self, event):
-        # Reset cursor when leaving the widget
         self.setCursor(Qt.CursorShape.ArrowCursor)
         super().leaveEvent(event)
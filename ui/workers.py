@@ -0,0 +1,69 @@
+# ui/workers.py
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from core.excel_io import OperationCancelled
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, int)  # rows done, rows total (0 when unknown)
+    finished = pyqtSignal(object)  # the job's result, e.g. the loaded FormDocument
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class IoJob(QRunnable):
+    # Runs one Excel load/save on a pool thread. Signals are queued back to the GUI thread,
+    # where the result is swapped in; nothing here touches widgets.
+    def __init__(self, function, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.signals = JobSignals()
+        self._function = function
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+        self.outcome = None  # "finished", "failed" or "cancelled" once run() returns, readable without the signals
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            result = self._function(*self._args, progress=self._progress, cancelled=self._cancel.is_set,
+                                    **self._kwargs)
+        except OperationCancelled:
+            self.outcome = "cancelled"
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.outcome = "failed"
+            self.signals.failed.emit(str(e))
+        else:
+            self.outcome = "finished"
+            self.signals.finished.emit(result)
+
+    def _progress(self, done, total):
+        self.signals.progress.emit(done, total or 0)
+
+
+class IoPool:
+    # Several jobs may run at once, e.g. a save while another workbook loads
+    def __init__(self, max_threads=4):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self.jobs = set()  # keeps running jobs (and their signals) alive
+
+    def start(self, job: IoJob):
+        # Connect to job.signals before starting it, or a quick job may finish unheard
+        self.jobs.add(job)
+        for signal in (job.signals.finished, job.signals.failed, job.signals.cancelled):
+            signal.connect(lambda *_, done=job: self.jobs.discard(done))
+        self.pool.start(job)
+        return job
+
+    def active_count(self):
+        return len(self.jobs)
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)